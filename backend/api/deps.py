@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 
 import jwt
@@ -10,6 +14,11 @@ from ..core.config import get_settings
 
 security = HTTPBearer(auto_error=False)
 
+# Resolved once at import; settings are immutable for the life of the process.
+_JWT_SECRET = get_settings().supabase_jwt_secret
+_JWT_ALGORITHMS = ["HS256"]
+_JWT_OPTIONS = {"verify_aud": False}
+
 
 @dataclass(frozen=True)
 class AuthenticatedUser:
@@ -18,6 +27,44 @@ class AuthenticatedUser:
     access_token: str
 
 
+# Verified tokens are remembered briefly so clients that reuse the same bearer
+# token (dashboard polling, repeated uploads) skip the HMAC check and JSON parse.
+TOKEN_CACHE_TTL_SECONDS = 5.0
+TOKEN_CACHE_MAX_ENTRIES = 4096
+
+_token_cache: OrderedDict[bytes, tuple[float, AuthenticatedUser]] = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def _cached_user(key: bytes) -> AuthenticatedUser | None:
+    now = time.monotonic()
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= now:
+            del _token_cache[key]
+            return None
+        _token_cache.move_to_end(key)
+        return user
+
+
+def _remember_user(key: bytes, user: AuthenticatedUser, exp: object) -> None:
+    now = time.monotonic()
+    expires_at = now + TOKEN_CACHE_TTL_SECONDS
+    if isinstance(exp, (int, float)):
+        # Never serve a cached user past the token's own expiry.
+        expires_at = min(expires_at, now + (exp - time.time()))
+    if expires_at <= now:
+        return
+    with _token_cache_lock:
+        _token_cache[key] = (expires_at, user)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.popitem(last=False)
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
 ) -> AuthenticatedUser:
@@ -25,16 +72,19 @@ def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
 
     token = credentials.credentials
-    settings = get_settings()
-    secret = settings.supabase_jwt_secret
-    if not secret:
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _cached_user(cache_key)
+    if cached is not None:
+        return cached
+
+    if not _JWT_SECRET:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Supabase JWT secret is not configured. Set SUPABASE_JWT_SECRET on the backend.",
         )
 
     try:
-        payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
+        payload = jwt.decode(token, _JWT_SECRET, algorithms=_JWT_ALGORITHMS, options=_JWT_OPTIONS)
     except jwt.PyJWTError as exc:  # type: ignore[attr-defined]
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token") from exc
 
@@ -42,5 +92,10 @@ def get_current_user(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
 
-    email = payload.get("email") or payload.get("user_metadata", {}).get("email") if isinstance(payload.get("user_metadata"), dict) else None
-    return AuthenticatedUser(id=str(user_id), email=email, access_token=token)
+    email = payload.get("email")
+    if not email:
+        metadata = payload.get("user_metadata")
+        email = metadata.get("email") if isinstance(metadata, dict) else None
+    user = AuthenticatedUser(id=str(user_id), email=email, access_token=token)
+    _remember_user(cache_key, user, payload.get("exp"))
+    return user
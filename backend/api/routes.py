@@ -2,8 +2,10 @@ from __future__ import annotations
 
 from typing import List
 
-from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
 
 from ..schemas import (
     AnalyticsSummary,
@@ -24,37 +26,49 @@ from ..services.supabase_storage import (
     fetch_latest_summary,
     store_dataset,
 )
-from ..services.chat_agent import run_chat_agent
+from ..services.chat_agent import forget_user_data, run_chat_agent
 from .deps import AuthenticatedUser, get_current_user
 
 router = APIRouter()
 
+_HEALTH = HealthResponse(service="Energy Insight")
+
+
+def _model_response(payload: BaseModel | List[BaseModel], status_code: int = 200) -> ORJSONResponse:
+    """Serialise models we built ourselves, skipping FastAPI's response re-validation."""
+    if isinstance(payload, list):
+        content = [item.model_dump(mode="json") for item in payload]
+    else:
+        content = payload.model_dump(mode="json")
+    return ORJSONResponse(content, status_code=status_code)
+
 
 @router.get("/health", response_model=HealthResponse, tags=["system"])
 async def health_check() -> HealthResponse:
-    return HealthResponse(service="Energy Insight")
+    return _HEALTH
 
 
 @router.post("/api/upload", response_model=AnalyticsSummary, tags=["analytics"], status_code=201)
 async def upload_dataset(
     file: UploadFile = File(...),
     current_user: AuthenticatedUser = Depends(get_current_user),
-) -> AnalyticsSummary:
-    if not file.filename.lower().endswith(".csv"):
+) -> ORJSONResponse:
+    filename = file.filename or ""
+    if not filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only .csv files are supported")
 
     try:
-        readings = parse_energy_csv(await file.read())
+        readings = await run_in_threadpool(parse_energy_csv, file.file)
     except CSVParseError as exc:
         raise HTTPException(status_code=400, detail=exc.detail) from exc
 
-    summary = build_analytics_summary(readings)
+    summary = await run_in_threadpool(build_analytics_summary, readings)
     summary = await apply_ai_recommendations(summary)
 
     try:
         await run_in_threadpool(
             store_dataset,
-            file.filename or "upload.csv",
+            filename,
             readings,
             summary,
             current_user.id,
@@ -65,8 +79,9 @@ async def upload_dataset(
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     except SupabaseConfigurationError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
+    forget_user_data(current_user.id)
 
-    return summary
+    return _model_response(summary, status_code=201)
 
 
 @router.post("/api/chat", response_model=ChatResponsePayload, tags=["analytics"])
@@ -96,34 +111,36 @@ async def chat_with_assistant(
 async def analytics_history(
     limit: int = 50,
     current_user: AuthenticatedUser = Depends(get_current_user),
-) -> List[DatasetRecord]:
+) -> ORJSONResponse:
     try:
         history = await run_in_threadpool(fetch_dataset_history, limit, current_user.id)
     except (SupabaseConfigurationError, SupabaseStorageError) as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
-    return history
+    return _model_response(history)
 
 
 @router.get("/api/analytics/datasets/{dataset_id}", response_model=DatasetDetail, tags=["analytics"])
 async def analytics_dataset(
     dataset_id: int,
+    limit: int | None = Query(None, ge=0, description="Readings per page; 0 returns the summary only."),
+    offset: int = Query(0, ge=0),
     current_user: AuthenticatedUser = Depends(get_current_user),
-) -> DatasetDetail:
+) -> ORJSONResponse:
     try:
-        detail = await run_in_threadpool(fetch_dataset_detail, dataset_id, current_user.id)
+        detail = await run_in_threadpool(fetch_dataset_detail, dataset_id, current_user.id, limit, offset)
     except SupabaseStorageError as exc:
         if "not found" in str(exc).lower():
             raise HTTPException(status_code=404, detail=str(exc)) from exc
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     except SupabaseConfigurationError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
-    return detail
+    return _model_response(detail)
 
 
 @router.get("/api/analytics/summary", response_model=AnalyticsSummary, tags=["analytics"])
 async def analytics_summary(
     current_user: AuthenticatedUser = Depends(get_current_user),
-) -> AnalyticsSummary:
+) -> ORJSONResponse:
     try:
         summary = await run_in_threadpool(fetch_latest_summary, current_user.id)
     except (SupabaseConfigurationError, SupabaseStorageError) as exc:
@@ -131,7 +148,7 @@ async def analytics_summary(
 
     if summary is None:
         raise HTTPException(status_code=404, detail="No analytics available. Upload a dataset first.")
-    return summary
+    return _model_response(summary)
 
 
 @router.delete("/api/analytics/datasets/{dataset_id}", status_code=204, response_class=Response, tags=["analytics"])
@@ -146,4 +163,5 @@ async def delete_analytics_dataset(
         raise HTTPException(status_code=status, detail=str(exc)) from exc
     except SupabaseConfigurationError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
+    forget_user_data(current_user.id)
     return Response(status_code=204)
@@ -4,14 +4,14 @@ import os
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Tuple
 
 from dotenv import load_dotenv
 
 API_TITLE = "Energy Insight API"
 API_VERSION = "0.4.0"
 
-DEFAULT_ALLOWED_ORIGINS = ["*"]
+DEFAULT_ALLOWED_ORIGINS: Tuple[str, ...] = ("*",)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
@@ -28,18 +28,39 @@ def _fetch_float(name: str, default: float) -> float:
         return default
 
 
+def _fetch_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _fetch_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
 @dataclass(frozen=True)
 class Settings:
     default_rate: float = _fetch_float("ENERGY_INSIGHT_DEFAULT_RATE", 0.32)
     co2_factor: float = _fetch_float("ENERGY_INSIGHT_CO2_FACTOR", 0.45)
     cost_bucket_percentile: float = _fetch_float("ENERGY_INSIGHT_COST_BUCKET_PERCENTILE", 0.66)
+    chat_snapshot_ttl_seconds: float = _fetch_float("ENERGY_INSIGHT_CHAT_SNAPSHOT_TTL", 60.0)
+    chat_answer_row_limit: int = _fetch_int("ENERGY_INSIGHT_CHAT_ANSWER_ROWS", 50)
     openai_model: str = os.getenv("OPENAI_RECOMMENDATION_MODEL", "gpt-4o-mini")
+    openai_strict_recommendations: bool = _fetch_bool("OPENAI_STRICT_RECOMMENDATIONS", True)
     supabase_url: str = os.getenv("SUPABASE_URL", "")
     supabase_key: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY", "")
     supabase_dataset_table: str = os.getenv("SUPABASE_DATASET_TABLE", "energy_datasets")
     supabase_readings_table: str = os.getenv("SUPABASE_READINGS_TABLE", "energy_readings")
     supabase_db_url: str = os.getenv("SUPABASE_DB_URL", "")
     supabase_jwt_secret: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    readings_insert_chunk_rows: int = _fetch_int("ENERGY_INSIGHT_READINGS_CHUNK_ROWS", 500)
 
 
 @lru_cache(maxsize=1)
@@ -47,9 +68,10 @@ def get_settings() -> Settings:
     return Settings()
 
 
-def get_allowed_origins() -> List[str]:
+@lru_cache(maxsize=1)
+def get_allowed_origins() -> Tuple[str, ...]:
     raw = os.getenv("ENERGY_INSIGHT_CORS_ORIGINS")
     if not raw:
         return DEFAULT_ALLOWED_ORIGINS
-    origins = [origin.strip() for origin in raw.split(",") if origin.strip()]
+    origins = tuple(origin.strip() for origin in raw.split(",") if origin.strip())
     return origins or DEFAULT_ALLOWED_ORIGINS
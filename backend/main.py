@@ -1,12 +1,31 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from .api.routes import router
 from .core.config import API_TITLE, API_VERSION, get_allowed_origins
+from .services.recommendations import close_openai_client
+from .services.supabase_storage import close_supabase
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    await close_openai_client()
+    close_supabase()
 
-app = FastAPI(title=API_TITLE, version=API_VERSION)
+
+app = FastAPI(
+    title=API_TITLE,
+    version=API_VERSION,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
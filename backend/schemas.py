@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any, List, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class StatCard(BaseModel):
@@ -105,6 +105,8 @@ class AnalyticsSummary(BaseModel):
 
 
 class HealthResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     status: Literal["ok"] = "ok"
     service: str
 
@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import csv
 import io
-from collections import defaultdict
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from datetime import date, datetime, time
-from typing import Dict, List, Sequence, Tuple
+from typing import BinaryIO, Iterator, List, Tuple
+
+import numpy as np
 
 from ..core.config import get_settings
 from ..schemas import (
@@ -31,32 +35,104 @@ class CSVParseError(Exception):
         self.detail = detail
 
 
-class EnergyReading:
-    __slots__ = ("reading_at", "kwh", "cost")
-
-    def __init__(self, reading_at: datetime, kwh: float, cost: float | None) -> None:
-        self.reading_at = reading_at
-        self.kwh = kwh
-        self.cost = cost
-
-    @property
-    def reading_date(self) -> date:
-        return self.reading_at.date()
-
-    @property
-    def reading_time(self) -> time:
-        return self.reading_at.time()
-
-
-def parse_energy_csv(file_bytes: bytes) -> List[EnergyReading]:
-    """Parse UTF-8 CSV content into structured energy readings."""
+@dataclass
+class EnergyReadings:
+    """Column-oriented energy readings, sorted by time; the arrays are aligned by index.
+
+    ``reading_at`` holds the wall-clock timestamps written in the file
+    (``datetime64[us]``), ``kwh`` and ``cost`` are ``float64``. ``cost`` is NaN
+    where the CSV had no value until ``build_analytics_summary`` fills it in.
+    ``utc_offset`` is ``None`` when no timestamp carried an offset; otherwise it
+    holds each reading's offset in seconds, NaN for readings without one.
+    """
+
+    reading_at: np.ndarray
+    kwh: np.ndarray
+    cost: np.ndarray
+    utc_offset: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.kwh)
+
+    @cached_property
+    def days(self) -> np.ndarray:
+        """Calendar day of each reading (``datetime64[D]``)."""
+        return self.reading_at.astype("datetime64[D]")
+
+    @cached_property
+    def hours(self) -> np.ndarray:
+        """Hour of day (0-23) of each reading."""
+        return self.reading_at.astype("datetime64[h]").astype(np.int64) % 24
+
+    @cached_property
+    def instants(self) -> np.ndarray:
+        """UTC instant of each reading (``datetime64[us]``); readings without an offset count as UTC."""
+        return _utc_instants(self.reading_at, self.utc_offset)
+
+    @cached_property
+    def iso_timestamps(self) -> List[str]:
+        """Wall-clock ``YYYY-MM-DDTHH:MM:SS`` string of each reading, formatted in one pass."""
+        return np.datetime_as_string(self.reading_at, unit="s").tolist()
+
+    @cached_property
+    def iso_instants(self) -> List[str]:
+        """Each reading as ``datetime.isoformat`` writes it: microseconds when non-zero, plus the offset."""
+        timestamps = self.iso_timestamps
+        fractional = self.reading_at.astype(np.int64) % 1_000_000 != 0
+        if fractional.any():
+            precise = np.datetime_as_string(self.reading_at, unit="us").tolist()
+            timestamps = [
+                exact if has_fraction else timestamp
+                for timestamp, exact, has_fraction in zip(timestamps, precise, fractional.tolist())
+            ]
+        if self.utc_offset is None:
+            return timestamps
+        return [
+            timestamp if offset != offset else timestamp + _format_utc_offset(offset)
+            for timestamp, offset in zip(timestamps, self.utc_offset.tolist())
+        ]
+
+
+def _utc_instants(reading_at: np.ndarray, utc_offset: np.ndarray | None) -> np.ndarray:
+    if utc_offset is None:
+        return reading_at
+    shift = np.round(np.nan_to_num(utc_offset) * 1_000_000).astype(np.int64).astype("timedelta64[us]")
+    return reading_at - shift
+
+
+@lru_cache(maxsize=64)
+def _format_utc_offset(seconds: float) -> str:
+    """Format an offset the way ``datetime.isoformat`` does (``+HH:MM[:SS[.ffffff]]``)."""
+    sign = "-" if seconds < 0 else "+"
+    hours, remainder = divmod(round(abs(seconds) * 1_000_000), 3_600_000_000)
+    minutes, remainder = divmod(remainder, 60_000_000)
+    whole_seconds, microseconds = divmod(remainder, 1_000_000)
+    text = f"{sign}{hours:02d}:{minutes:02d}"
+    if whole_seconds or microseconds:
+        text += f":{whole_seconds:02d}"
+        if microseconds:
+            text += f".{microseconds:06d}"
+    return text
+
+
+def parse_energy_csv(stream: BinaryIO) -> EnergyReadings:
+    """Parse a UTF-8 CSV byte stream into column-oriented energy readings.
+
+    The stream is decoded incrementally, so the upload is never held in memory
+    as one decoded string.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
     try:
-        decoded = file_bytes.decode("utf-8")
+        return _read_energy_csv(csv.reader(text))
     except UnicodeDecodeError as exc:
         raise CSVParseError("CSV file must be UTF-8 encoded") from exc
+    finally:
+        # Leave the caller's stream open; closing the wrapper would close it.
+        text.detach()
 
-    reader = csv.DictReader(io.StringIO(decoded))
-    fieldnames = reader.fieldnames or []
+
+def _read_energy_csv(reader: Iterator[List[str]]) -> EnergyReadings:
+    fieldnames = next(reader, [])
     has_datetime = "datetime" in fieldnames
     required_columns = {"kwh"}
     if not has_datetime:
@@ -68,81 +144,163 @@ def parse_energy_csv(file_bytes: bytes) -> List[EnergyReading]:
             raise CSVParseError(f"CSV requires columns: {missing}")
         raise CSVParseError("CSV headers missing required columns")
 
-    readings: List[EnergyReading] = []
+    # Resolve column positions once so rows can be read as plain lists instead
+    # of allocating a dict per row (last duplicate header wins, as with DictReader).
+    column_index = {name: index for index, name in enumerate(fieldnames)}
+    datetime_index = column_index["datetime" if has_datetime else "date"]
+    kwh_index = column_index["kwh"]
+    time_index = column_index.get("time")
+    cost_index = column_index.get("cost")
+    width = len(fieldnames)
+
+    raw_timestamps: List[str] = []
+    raw_times: List[str] | None = [] if time_index is not None else None
+    kwh_values: List[float] = []
+    cost_values: List[float] = []
+
+    # This loop runs once per CSV row; bind loop-invariant lookups to locals.
+    missing_cost = np.nan
+    append_timestamp = raw_timestamps.append
+    append_time = raw_times.append if raw_times is not None else None
+    append_kwh = kwh_values.append
+    append_cost = cost_values.append
     for row in reader:
-        raw_datetime = (row.get("datetime") or "").strip() if has_datetime else (row.get("date") or "").strip()
-        kwh_raw = (row.get("kwh") or "").strip()
+        if len(row) < width:
+            if not row:
+                continue
+            row += [""] * (width - len(row))
+        raw_datetime = row[datetime_index].strip()
+        kwh_raw = row[kwh_index].strip()
         if not raw_datetime or not kwh_raw:
             continue
         try:
-            reading_at = _parse_csv_datetime(raw_datetime, row.get("time"))
             kwh_value = float(kwh_raw)
         except ValueError:
             continue
 
-        cost_value: float | None = None
-        cost_raw = (row.get("cost") or "").strip()
+        cost_value = missing_cost
+        cost_raw = row[cost_index].strip() if cost_index is not None else ""
         if cost_raw:
             try:
                 cost_value = float(cost_raw)
             except ValueError:
-                cost_value = None
+                cost_value = missing_cost
 
-        readings.append(EnergyReading(reading_at, kwh_value, cost_value))
+        append_timestamp(raw_datetime)
+        if append_time is not None:
+            append_time(row[time_index].strip())
+        append_kwh(kwh_value)
+        append_cost(cost_value)
 
-    if not readings:
+    if not raw_timestamps:
         raise CSVParseError("No valid rows found in CSV")
 
-    return readings
+    reading_at, utc_offset = _parse_timestamps(raw_timestamps, raw_times)
+    kwh = np.array(kwh_values, dtype=np.float64)
+    cost = np.array(cost_values, dtype=np.float64)
+
+    valid = ~np.isnat(reading_at)
+    if not valid.all():
+        if not valid.any():
+            raise CSVParseError("No valid rows found in CSV")
+        reading_at, kwh, cost = reading_at[valid], kwh[valid], cost[valid]
+        if utc_offset is not None:
+            utc_offset = utc_offset[valid]
+
+    order = np.argsort(_utc_instants(reading_at, utc_offset), kind="stable")
+    return EnergyReadings(
+        reading_at=reading_at[order],
+        kwh=kwh[order],
+        cost=cost[order],
+        utc_offset=utc_offset[order] if utc_offset is not None else None,
+    )
+
+
+# numpy parses plain "YYYY-MM-DD[T ]HH[:MM[:SS[.f]]]" values the way fromisoformat does, but
+# would shift UTC offsets, accept keywords such as "now"/"NaT", trailing dots or spaces, and
+# read "20240105" as a year. A column with any value outside that strict shape goes through
+# the row-by-row fromisoformat path instead.
+_NUMPY_UNSAFE_TIMESTAMP = re.compile(
+    r"^(?!\d{4}-\d\d-\d\d(?:[T ]\d\d(?::\d\d(?::\d\d(?:\.\d+)?)?)?)?$)",
+    re.MULTILINE,
+)
+
+
+def _parse_timestamps(values: List[str], times: List[str] | None) -> Tuple[np.ndarray, np.ndarray | None]:
+    """Parse timestamp strings into wall-clock ``datetime64[us]`` plus UTC offsets in seconds.
+
+    Unparseable entries become NaT. The offsets are ``None`` when no value had one.
+    """
+    if times is not None:
+        candidates = [f"{value}T{time_part}" if time_part else value for value, time_part in zip(values, times)]
+    else:
+        candidates = values
+
+    if not _NUMPY_UNSAFE_TIMESTAMP.search("\n".join(candidates)):
+        try:
+            return np.array(candidates, dtype="datetime64[us]"), None
+        except ValueError:
+            pass
+
+    parsed: List[datetime | None] = []
+    offsets: List[float] = []
+    has_offset = False
+    for index, value in enumerate(values):
+        try:
+            reading_at = _parse_csv_datetime(value, times[index] if times is not None else None)
+        except ValueError:
+            parsed.append(None)
+            offsets.append(np.nan)
+            continue
+        offset = reading_at.utcoffset()
+        if offset is None:
+            offsets.append(np.nan)
+        else:
+            # Day/hour buckets use the file's wall-clock time; the offset keeps the real instant.
+            has_offset = True
+            offsets.append(offset.total_seconds())
+            reading_at = reading_at.replace(tzinfo=None)
+        parsed.append(reading_at)
+    utc_offset = np.array(offsets, dtype=np.float64) if has_offset else None
+    return np.array(parsed, dtype="datetime64[us]"), utc_offset
 
 
 def _parse_csv_datetime(value: str, time_raw: str | None) -> datetime:
     """Parse datetime or date/time strings from CSV into a datetime object."""
-    value = value.strip()
     if not value:
         raise ValueError("empty datetime")
 
-    try:
-        # First try to parse as full ISO datetime
-        return datetime.fromisoformat(value)
-    except ValueError:
-        pass
-
-    # Attempt to combine separate date and time columns
-    try:
-        date_part = date.fromisoformat(value)
-    except ValueError as exc:
-        raise ValueError("invalid date") from exc
-
-    time_part = (time_raw or "").strip() if time_raw is not None else ""
-    if not time_part:
-        combined = datetime.combine(date_part, time.min)
-        return combined
-
-    try:
-        parsed_time = time.fromisoformat(time_part)
-    except ValueError as exc:
-        raise ValueError("invalid time") from exc
+    if time_raw:
+        # Combine separate date and time columns when both are present. An unparseable
+        # time cell raises, so the row is dropped instead of landing at midnight.
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            return datetime.combine(day, time.fromisoformat(time_raw))
 
-    return datetime.combine(date_part, parsed_time)
+    return datetime.fromisoformat(value)
 
 
-def build_analytics_summary(readings: List[EnergyReading]) -> AnalyticsSummary:
-    """Aggregate analytics metrics from a list of readings."""
-    readings.sort(key=lambda r: r.reading_at)
+def build_analytics_summary(readings: EnergyReadings) -> AnalyticsSummary:
+    """Aggregate analytics metrics from column-oriented readings."""
     _compute_costs(readings)
 
-    total_kwh = sum(r.kwh for r in readings)
-    total_cost = sum(r.cost or 0.0 for r in readings)
-    total_co2 = total_kwh * SETTINGS.co2_factor
+    # Every per-day metric below is derived from this single grouping pass.
+    daily = _aggregate_daily_totals(readings)
+    total_kwh = float(daily.kwh.sum())
+    total_cost = float(daily.cost.sum())
+    co2_factor = SETTINGS.co2_factor
+    total_co2 = total_kwh * co2_factor
 
-    daily_totals = _aggregate_daily_totals(readings)
+    day_labels: List[str] = np.datetime_as_string(daily.days, unit="D").tolist()
     usage = [
-        UsagePoint(date=day.isoformat(), kwh=round(data["kwh"], 2))
-        for day, data in daily_totals
+        UsagePoint(date=label, kwh=round(kwh, 2))
+        for label, kwh in zip(day_labels, daily.kwh.tolist())
     ]
 
-    peak_day = max(daily_totals, key=lambda item: item[1]["kwh"])
+    peak_index = int(np.argmax(daily.kwh))
 
     stats = [
         StatCard(
@@ -167,19 +325,19 @@ def build_analytics_summary(readings: List[EnergyReading]) -> AnalyticsSummary:
             unit="kg",
             change="N/A",
             change_type="neutral",
-            trend=f"Factor {SETTINGS.co2_factor:.2f} kg/kWh",
+            trend=f"Factor {co2_factor:.2f} kg/kWh",
         ),
         StatCard(
             title="Peak Usage Day",
-            value=round(peak_day[1]["kwh"], 1),
+            value=round(float(daily.kwh[peak_index]), 1),
             unit="kWh",
-            change=peak_day[0].isoformat(),
+            change=day_labels[peak_index],
             change_type="neutral",
             trend="Highest daily consumption",
         ),
     ]
 
-    breakdown_totals = _cost_breakdown(readings)
+    breakdown_totals = _cost_breakdown(readings, daily)
     cost_breakdown = [
         CostSegment(segment=name, value=round(value, 2))
         for name, value in breakdown_totals.items()
@@ -190,11 +348,11 @@ def build_analytics_summary(readings: List[EnergyReading]) -> AnalyticsSummary:
         SummaryBadge(label="Cost", value=f"{total_cost:.2f} €"),
         SummaryBadge(
             label="Window",
-            value=f"{daily_totals[0][0].isoformat()} → {daily_totals[-1][0].isoformat()}",
+            value=f"{day_labels[0]} → {day_labels[-1]}",
         ),
     ]
 
-    insights = _calculate_insights(readings, daily_totals, total_kwh, total_cost)
+    insights = _calculate_insights(readings, daily, day_labels, peak_index, total_kwh, total_cost)
     return AnalyticsSummary(
         stats=stats,
         usage=usage,
@@ -205,69 +363,93 @@ def build_analytics_summary(readings: List[EnergyReading]) -> AnalyticsSummary:
     )
 
 
-def _compute_costs(readings: Sequence[EnergyReading]) -> None:
-    provided_costs = [r.cost for r in readings if r.cost is not None]
-    if provided_costs:
-        kwh_with_cost = sum(r.kwh for r in readings if r.cost is not None)
-        rate = (sum(provided_costs) / kwh_with_cost) if kwh_with_cost else SETTINGS.default_rate
-        for reading in readings:
-            if reading.cost is None:
-                reading.cost = reading.kwh * rate
-    else:
-        for reading in readings:
-            reading.cost = reading.kwh * SETTINGS.default_rate
-
-
-def _cost_breakdown(readings: Sequence[EnergyReading]) -> dict[str, float]:
-    buckets: dict[str, float] = defaultdict(float)
-    threshold = _kwh_threshold(readings, SETTINGS.cost_bucket_percentile)
-    for reading in readings:
-        bucket = _bucket_for_reading(reading, threshold)
-        buckets[bucket] += reading.cost or 0.0
-    return buckets
+@dataclass
+class _DailyTotals:
+    """Per-day totals in calendar order, plus each reading's position in them."""
+
+    days: np.ndarray
+    kwh: np.ndarray
+    cost: np.ndarray
+    hourly_kwh: np.ndarray
+    weekend: np.ndarray
+    reading_day_index: np.ndarray
+
+
+def _compute_costs(readings: EnergyReadings) -> None:
+    missing = np.isnan(readings.cost)
+    if not missing.any():
+        # Every row came with a cost, which is the usual case for CSVs with a cost column.
+        return
+    rate = SETTINGS.default_rate
+    if not missing.all():
+        provided = ~missing
+        kwh_with_cost = float(readings.kwh[provided].sum())
+        if kwh_with_cost:
+            rate = float(readings.cost[provided].sum()) / kwh_with_cost
+    readings.cost[missing] = readings.kwh[missing] * rate
+
+
+def _weekdays(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday (weekday 3, Monday == 0).
+    return (days.astype(np.int64) + 3) % 7
+
+
+def _cost_breakdown(readings: EnergyReadings, daily: _DailyTotals) -> dict[str, float]:
+    threshold = _kwh_threshold(readings.kwh, SETTINGS.cost_bucket_percentile)
+    weekend = daily.weekend[daily.reading_day_index]
+    peak = ~weekend & (readings.kwh >= threshold)
+    off_peak = ~weekend & ~peak
+
+    # Segments are reported in the order they first appear in the data.
+    segments = [("Weekend", weekend), ("Peak Hours", peak), ("Off-Peak", off_peak)]
+    present = sorted((int(mask.argmax()), name, mask) for name, mask in segments if mask.any())
+    return {name: float(readings.cost[mask].sum()) for _, name, mask in present}
+
+
+def _aggregate_daily_totals(readings: EnergyReadings) -> _DailyTotals:
+    days, day_index = np.unique(readings.days, return_inverse=True)
+
+    # Each bincount adds in reading order, keeping daily sums identical to a plain loop.
+    return _DailyTotals(
+        days=days,
+        kwh=np.bincount(day_index, weights=readings.kwh, minlength=len(days)),
+        cost=np.bincount(day_index, weights=readings.cost, minlength=len(days)),
+        hourly_kwh=np.bincount(readings.hours, weights=readings.kwh, minlength=24),
+        weekend=_weekdays(days) >= 5,
+        reading_day_index=day_index,
+    )
 
 
-def _aggregate_daily_totals(readings: Sequence[EnergyReading]) -> List[Tuple[date, Dict[str, float]]]:
-    daily: Dict[date, Dict[str, float]] = defaultdict(lambda: {"kwh": 0.0, "cost": 0.0})
-    for reading in readings:
-        bucket = daily[reading.reading_date]
-        bucket["kwh"] += reading.kwh
-        bucket["cost"] += reading.cost or 0.0
-    ordered = sorted(daily.items(), key=lambda item: item[0])
-    return ordered
+def _daily_snapshot(daily: _DailyTotals, day_labels: List[str], index: int) -> DailyCostSnapshot:
+    return DailyCostSnapshot(
+        date=day_labels[index],
+        kwh=round(float(daily.kwh[index]), 2),
+        cost=round(float(daily.cost[index]), 2),
+    )
 
 
 def _calculate_insights(
-    readings: Sequence[EnergyReading],
-    daily_totals: List[Tuple[date, Dict[str, float]]],
+    readings: EnergyReadings,
+    daily: _DailyTotals,
+    day_labels: List[str],
+    peak_index: int,
     total_kwh: float,
     total_cost: float,
 ) -> SummaryInsights | None:
-    if not readings or not daily_totals or total_kwh <= 0:
+    if not readings or not len(daily.days) or total_kwh <= 0:
         return None
 
-    days_covered = len(daily_totals)
+    days_covered = len(daily.days)
     average_cost_per_kwh = total_cost / total_kwh if total_kwh else 0.0
 
-    peak_day_date, peak_day_data = max(daily_totals, key=lambda item: item[1]["kwh"])
-    peak_day_snapshot = DailyCostSnapshot(
-        date=peak_day_date.isoformat(),
-        kwh=round(peak_day_data["kwh"], 2),
-        cost=round(peak_day_data["cost"], 2),
-    )
+    peak_day_snapshot = _daily_snapshot(daily, day_labels, peak_index)
 
-    top_expensive = sorted(daily_totals, key=lambda item: item[1]["cost"], reverse=True)[:5]
-    top_expensive_snapshots = [
-        DailyCostSnapshot(
-            date=day.isoformat(),
-            kwh=round(data["kwh"], 2),
-            cost=round(data["cost"], 2),
-        )
-        for day, data in top_expensive
-    ]
+    # A stable sort on the negated cost keeps earlier days first on ties.
+    top_expensive = np.argsort(-daily.cost, kind="stable")[:5]
+    top_expensive_snapshots = [_daily_snapshot(daily, day_labels, int(index)) for index in top_expensive]
 
-    weekend_vs_weekday = _calculate_weekend_weekday_comparison(daily_totals)
-    peak_window = _calculate_peak_window(readings, days_covered)
+    weekend_vs_weekday = _calculate_weekend_weekday_comparison(daily)
+    peak_window = _calculate_peak_window(daily.hourly_kwh, days_covered)
     quarter_usage = _calculate_quarter_usage(readings)
 
     return SummaryInsights(
@@ -283,56 +465,43 @@ def _calculate_insights(
     )
 
 
-def _calculate_weekend_weekday_comparison(
-    daily_totals: List[Tuple[date, Dict[str, float]]]
-) -> WeekendWeekdayComparison | None:
-    weekend_entries = [(day, data) for day, data in daily_totals if day.weekday() >= 5]
-    weekday_entries = [(day, data) for day, data in daily_totals if day.weekday() < 5]
-
-    if not weekend_entries and not weekday_entries:
+def _calculate_weekend_weekday_comparison(daily: _DailyTotals) -> WeekendWeekdayComparison | None:
+    if not len(daily.days):
         return None
 
-    def _averages(entries: List[Tuple[date, Dict[str, float]]]) -> Tuple[float, float]:
-        if not entries:
+    def _averages(mask: np.ndarray) -> Tuple[float, float]:
+        day_count = int(mask.sum())
+        if not day_count:
             return 0.0, 0.0
-        total_cost = sum(data["cost"] for _, data in entries)
-        total_kwh = sum(data["kwh"] for _, data in entries)
-        avg_daily_cost = total_cost / len(entries)
+        total_cost = float(daily.cost[mask].sum())
+        total_kwh = float(daily.kwh[mask].sum())
+        avg_daily_cost = total_cost / day_count
         avg_cost_per_kwh = total_cost / total_kwh if total_kwh else 0.0
         return avg_daily_cost, avg_cost_per_kwh
 
-    weekend_avg_daily, weekend_avg_per_kwh = _averages(weekend_entries)
-    weekday_avg_daily, weekday_avg_per_kwh = _averages(weekday_entries)
+    weekend_avg_daily, weekend_avg_per_kwh = _averages(daily.weekend)
+    weekday_avg_daily, weekday_avg_per_kwh = _averages(~daily.weekend)
+    weekend_days = int(daily.weekend.sum())
 
     return WeekendWeekdayComparison(
         weekend_avg_cost_per_kwh=round(weekend_avg_per_kwh, 2),
         weekday_avg_cost_per_kwh=round(weekday_avg_per_kwh, 2),
         weekend_avg_daily_cost=round(weekend_avg_daily, 2),
         weekday_avg_daily_cost=round(weekday_avg_daily, 2),
-        weekend_days=len(weekend_entries),
-        weekday_days=len(weekday_entries),
+        weekend_days=weekend_days,
+        weekday_days=len(daily.days) - weekend_days,
     )
 
 
-def _calculate_peak_window(readings: Sequence[EnergyReading], days_covered: int) -> PeakWindow | None:
-    if not readings or days_covered == 0:
+def _calculate_peak_window(hourly_totals: np.ndarray, days_covered: int) -> PeakWindow | None:
+    if days_covered == 0:
         return None
 
-    hourly_totals: Dict[int, float] = defaultdict(float)
-    for reading in readings:
-        hourly_totals[reading.reading_at.hour] += reading.kwh
-
-    best_total = -1.0
-    best_start = 0
     window_hours = 2
-    for start_hour in range(24):
-        window_total = 0.0
-        for offset in range(window_hours):
-            hour = (start_hour + offset) % 24
-            window_total += hourly_totals.get(hour, 0.0)
-        if window_total > best_total:
-            best_total = window_total
-            best_start = start_hour
+    # windows[h] is the total for hours h .. h + window_hours - 1, wrapping past midnight.
+    windows = sum(np.roll(hourly_totals, -offset) for offset in range(window_hours))
+    best_start = int(np.argmax(windows))
+    best_total = float(windows[best_start])
 
     if best_total <= 0:
         return None
@@ -345,47 +514,40 @@ def _calculate_peak_window(readings: Sequence[EnergyReading], days_covered: int)
     )
 
 
-def _calculate_quarter_usage(readings: Sequence[EnergyReading]) -> QuarterUsageComparison | None:
+def _calculate_quarter_usage(readings: EnergyReadings) -> QuarterUsageComparison | None:
     if not readings:
         return None
 
-    quarter_totals: Dict[Tuple[int, int], float] = defaultdict(float)
-    for reading in readings:
-        dt = reading.reading_at
-        quarter = (dt.month - 1) // 3 + 1
-        quarter_totals[(dt.year, quarter)] += reading.kwh
-
-    if len(quarter_totals) < 2:
+    # Quarters are counted from 1970Q1, so quarter_id // 4 is the year offset.
+    months = readings.days.astype("datetime64[M]").astype(np.int64)
+    quarter_ids, quarter_index = np.unique(months // 3, return_inverse=True)
+    if len(quarter_ids) < 2:
         return None
 
-    sorted_totals = sorted(quarter_totals.items())
-    start_key, start_value = sorted_totals[0]
-    end_key, end_value = sorted_totals[-1]
+    quarter_totals = np.bincount(quarter_index, weights=readings.kwh, minlength=len(quarter_ids))
+    start_id, end_id = int(quarter_ids[0]), int(quarter_ids[-1])
+    start_value, end_value = float(quarter_totals[0]), float(quarter_totals[-1])
     delta = end_value - start_value
     delta_percent = (delta / start_value * 100) if start_value else None
 
     return QuarterUsageComparison(
-        start_label=f"{start_key[0]}Q{start_key[1]}",
+        start_label=_quarter_label(start_id),
         start_kwh=round(start_value, 2),
-        end_label=f"{end_key[0]}Q{end_key[1]}",
+        end_label=_quarter_label(end_id),
         end_kwh=round(end_value, 2),
         delta_kwh=round(delta, 2),
         delta_percent=round(delta_percent, 2) if delta_percent is not None else None,
     )
 
 
+def _quarter_label(quarter_id: int) -> str:
+    year, quarter = divmod(quarter_id, 4)
+    return f"{1970 + year}Q{quarter + 1}"
 
-def _kwh_threshold(readings: Sequence[EnergyReading], percentile: float) -> float:
-    if not readings:
-        return 0.0
-    sorted_kwh = sorted(r.kwh for r in readings)
-    index = min(int(len(sorted_kwh) * percentile), len(sorted_kwh) - 1)
-    return sorted_kwh[index]
 
-
-def _bucket_for_reading(reading: EnergyReading, threshold: float) -> str:
-    if reading.reading_date.weekday() >= 5:
-        return "Weekend"
-    if reading.kwh >= threshold:
-        return "Peak Hours"
-    return "Off-Peak"
+def _kwh_threshold(kwh: np.ndarray, percentile: float) -> float:
+    if not len(kwh):
+        return 0.0
+    # Selecting the k-th smallest value is O(n); a full sort is not needed.
+    index = min(int(len(kwh) * percentile), len(kwh) - 1)
+    return float(np.partition(kwh, index)[index])
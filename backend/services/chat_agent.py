@@ -3,31 +3,77 @@ from __future__ import annotations
 import json
 import re
 import sqlite3
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta, timezone
-from typing import Any, Dict, List, Sequence
+from functools import lru_cache
+from hashlib import sha256
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
 
+import orjson
 from postgrest import APIError
 
 from ..core.config import get_settings
 from ..schemas import ChatHistoryMessage
 from .supabase_storage import SupabaseStorageError, get_supabase_client
 
-try:
+if TYPE_CHECKING:
     from openai import OpenAI
-except ImportError:  # pragma: no cover - optional dependency
-    OpenAI = None  # type: ignore[assignment]
 
 SETTINGS = get_settings()
 _openai_client: OpenAI | None = None # type: ignore
+# Capabilities of the installed SDK, probed once instead of on every LLM call.
+_openai_has_responses = False
+_responses_accepts_format = True
 
 ALLOWED_TABLES = {"energy_datasets", "energy_readings"}
+# Whole-word table references in lowercased SQL (energy_readings_v2 is not energy_readings).
+_TABLE_RE = re.compile(r"\b(" + "|".join(sorted(ALLOWED_TABLES)) + r")\b")
+# Keywords are word-bounded so identifiers such as updated_at or created_on are allowed.
 FORBIDDEN_PATTERNS = re.compile(
-    r";|--|/\*|\x00|\u0000|commit|rollback|insert|update|delete|drop|create|alter|grant|revoke|truncate|call",
+    r";|--|/\*|\x00|\b(?:commit|rollback|insert|update|delete|drop|create|alter|grant|revoke|truncate|call)\b",
     re.IGNORECASE,
 )
 SQL_LIMIT = 200
 
+# Messages made only of greetings, thanks or acknowledgements (English and French) skip
+# the SQL planning call. Anything else, and every follow-up turn, still goes to the
+# planner, which already declines questions unrelated to the energy data.
+SMALL_TALK_PATTERN = re.compile(
+    r"^[\W_]*(?:(?:"
+    r"hi|hello|hey|hiya|yo|good (?:morning|afternoon|evening)|bonjour|bonsoir|salut|coucou|"
+    r"thanks|thank you|thx|ty|cheers|merci|merci beaucoup|"
+    r"ok|okay|k|cool|great|nice|perfect|super|parfait|génial|genial|d'accord|dac|"
+    r"bye|goodbye|see you|au revoir|à plus|a plus"
+    r")[\W_]*)+$",
+    re.IGNORECASE,
+)
+OFF_TOPIC_ANALYSIS = (
+    "The question does not refer to the uploaded energy data. "
+    "Ask about consumption, cost, CO2 emissions, or a specific time period."
+)
+
+# Read-only query function installed in Postgres (see "Chat SQL in Postgres" in the README).
+PG_QUERY_RPC = "run_readonly_sql"
+_pg_rpc_available = True
+# Snapshot fetches are independent network calls, so tables are loaded side by side.
+_snapshot_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-snapshot")
+
+# Loaded SQLite sandboxes are reused per user until the TTL passes or their datasets change.
+SQLITE_SANDBOX_MAX_USERS = 32
+# A user's dataset signature is re-read at most this often; uploads and deletes handled
+# by this process drop it straight away through forget_user_data().
+DATASET_SIGNATURE_TTL_SECONDS = 10.0
+DATASET_SIGNATURE_MAX_USERS = 1024
+# Query results are keyed by user, SQL and dataset signature. The TTL bounds staleness for
+# queries that depend on the current date.
+RESULT_CACHE_TTL_SECONDS = 300.0
+RESULT_CACHE_MAX_ENTRIES = 256
+
 TABLE_SCHEMAS: Dict[str, List[tuple[str, str]]] = {
     "energy_datasets": [
         ("id", "INTEGER"),
@@ -51,6 +97,19 @@ TABLE_SCHEMAS: Dict[str, List[tuple[str, str]]] = {
     ],
 }
 
+# SQLite statements for each sandbox table, derived once from the static schemas.
+_COLUMN_NAMES: Dict[str, tuple[str, ...]] = {
+    table: tuple(name for name, _ in schema) for table, schema in TABLE_SCHEMAS.items()
+}
+_CREATE_SQL: Dict[str, str] = {
+    table: f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{name} {type_}' for name, type_ in schema)})"
+    for table, schema in TABLE_SCHEMAS.items()
+}
+_INSERT_SQL: Dict[str, str] = {
+    table: f"INSERT INTO {table} ({', '.join(names)}) VALUES ({','.join('?' for _ in names)})"
+    for table, names in _COLUMN_NAMES.items()
+}
+
 SQL_ANALYST_SYSTEM_PROMPT_TEMPLATE = (
     "You are an SQL analyst for Energy Insight. Today's date is {today}. Use this reference when interpreting "
     "relative time phrases (for example, 'last month' refers to the calendar month preceding {today}). You must "
@@ -83,20 +142,36 @@ def _current_date_iso() -> str:
     return datetime.now(timezone.utc).date().isoformat()
 
 
+# System prompts only interpolate the UTC date (never a time of day), so each one is
+# byte-identical for a whole day and forms a stable prefix for provider prompt caching.
+@lru_cache(maxsize=2)
+def _sql_system_prompt_for(today: str) -> str:
+    return SQL_ANALYST_SYSTEM_PROMPT_TEMPLATE.format(limit=SQL_LIMIT, today=today)
+
+
+@lru_cache(maxsize=2)
+def _response_system_prompt_for(today: str) -> str:
+    return RESPONSE_SYSTEM_PROMPT_TEMPLATE.format(today=today)
+
+
 def _sql_system_prompt() -> str:
-    return SQL_ANALYST_SYSTEM_PROMPT_TEMPLATE.format(limit=SQL_LIMIT, today=_current_date_iso())
+    return _sql_system_prompt_for(_current_date_iso())
 
 
 def _response_system_prompt() -> str:
-    return RESPONSE_SYSTEM_PROMPT_TEMPLATE.format(today=_current_date_iso())
+    return _response_system_prompt_for(_current_date_iso())
 
 
 def _get_openai_client() -> OpenAI | None: # type: ignore
-    global _openai_client
-    if OpenAI is None:
-        return None
+    global _openai_client, _openai_has_responses
     if not _openai_client:
+        try:
+            # Imported on first use so processes that never serve chat skip the SDK.
+            from openai import OpenAI
+        except ImportError:  # pragma: no cover - optional dependency
+            return None
         _openai_client = OpenAI()
+        _openai_has_responses = hasattr(_openai_client, "responses")
     return _openai_client
 
 
@@ -111,7 +186,7 @@ class SupabaseSQLExecutionError(RuntimeError):
     pass
 
 
-def _fetch_table_snapshot(table: str, user_id: str, limit: int = 2000) -> List[Dict[str, Any]]:
+def _fetch_table_snapshot(table: str, user_id: str, limit: int = 2000) -> List[tuple[Any, ...]]:
     client = get_supabase_client()
     try:
         query = client.table(table).select("*").limit(limit)
@@ -121,39 +196,44 @@ def _fetch_table_snapshot(table: str, user_id: str, limit: int = 2000) -> List[D
         raise SupabaseSQLExecutionError(f"Unable to load data from {table}: {exc.message}") from exc
     except SupabaseStorageError as exc:
         raise SupabaseSQLExecutionError(str(exc)) from exc
-    data = response.data or []
-    normalised: List[Dict[str, Any]] = []
-    for row in data:
-        cleaned: Dict[str, Any] = {}
-        for column, _ in TABLE_SCHEMAS[table]:
-            value = row.get(column)
-            if isinstance(value, dict):
-                cleaned[column] = json.dumps(value)
-            else:
-                cleaned[column] = value
-        normalised.append(cleaned)
-    return normalised
+    # Rows go straight to SQLite parameter tuples in schema column order.
+    column_names = _COLUMN_NAMES[table]
+    return [
+        tuple(json.dumps(value) if isinstance(value, dict) else value for value in map(row.get, column_names))
+        for row in response.data or []
+    ]
 
 
-def _load_sqlite_table(conn: sqlite3.Connection, table: str, rows: List[Dict[str, Any]]) -> None:
-    schema = TABLE_SCHEMAS[table]
-    columns_sql = ", ".join(f"{name} {type_}" for name, type_ in schema)
-    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns_sql})")
-    if not rows:
-        return
-
-    column_names = [name for name, _ in schema]
-    placeholders = ",".join("?" for _ in column_names)
-    payload: List[tuple[Any, ...]] = []
-    for row in rows:
-        payload.append(tuple(row.get(col) for col in column_names))
-    conn.executemany(
-        f"INSERT INTO {table} ({', '.join(column_names)}) VALUES ({placeholders})",
-        payload,
-    )
+def _load_sqlite_table(conn: sqlite3.Connection, table: str, rows: List[tuple[Any, ...]]) -> None:
+    conn.execute(_CREATE_SQL[table])
+    if rows:
+        conn.executemany(_INSERT_SQL[table], rows)
+
+
+_fromisoformat = datetime.fromisoformat
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_text(text: str) -> datetime | None:
+    # Column values repeat heavily across rows (reading_date especially), so each
+    # distinct string is parsed once per process.
+    try:
+        return _fromisoformat(text[:-1] + "+00:00" if text[-1:] == "Z" else text)
+    except ValueError:
+        pass
+    stripped = text.strip()
+    if stripped != text:
+        return _parse_iso_text(stripped) if stripped else None
+    try:
+        dt = datetime.strptime(text, "%Y-%m-%d")
+        return dt.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
 
 
 def _parse_iso_datetime(value: Any) -> datetime | None:
+    if isinstance(value, str):
+        return _parse_iso_text(value)
     if value is None:
         return None
     if isinstance(value, datetime):
@@ -162,50 +242,52 @@ def _parse_iso_datetime(value: Any) -> datetime | None:
         return datetime.combine(value, datetime.min.time(), tzinfo=timezone.utc)
     if isinstance(value, (int, float)):
         return datetime.fromtimestamp(value, tz=timezone.utc)
+    return _parse_iso_text(str(value))
+
+
+_DAY_START = {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}
+_MONTH_START = {"day": 1, **_DAY_START}
+# Fields reset by each date_trunc unit; week and quarter also move the date first.
+_TRUNC_FIELDS: Dict[str, Dict[str, int]] = {
+    "second": {"microsecond": 0},
+    "minute": {"second": 0, "microsecond": 0},
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": _DAY_START,
+    "week": _DAY_START,
+    "month": _MONTH_START,
+    "quarter": _MONTH_START,
+    "year": {"month": 1, **_MONTH_START},
+}
 
-    text = str(value).strip()
-    if not text:
+
+def _truncate_datetime(unit: str, dt: datetime) -> datetime:
+    fields = _TRUNC_FIELDS.get(unit)
+    if fields is None:
+        return dt
+    if unit == "week":
+        dt -= timedelta(days=dt.weekday())
+    elif unit == "quarter":
+        return dt.replace(month=((dt.month - 1) // 3) * 3 + 1, **fields)
+    return dt.replace(**fields)
+
+
+@lru_cache(maxsize=4096)
+def _date_trunc_text(unit: str, text: str) -> str | None:
+    # Truncated values repeat heavily (twelve months in a year of readings), so
+    # each distinct (unit, value) pair is computed once.
+    dt = _parse_iso_text(text)
+    if dt is None:
         return None
-    try:
-        if text.endswith("Z"):
-            return datetime.fromisoformat(text.replace("Z", "+00:00"))
-        return datetime.fromisoformat(text)
-    except ValueError:
-        try:
-            dt = datetime.strptime(text, "%Y-%m-%d")
-            return dt.replace(tzinfo=timezone.utc)
-        except ValueError:
-            return None
+    return _truncate_datetime(unit.lower(), dt).isoformat()
 
 
 def _sqlite_date_trunc(unit: str, value: Any) -> str | None:
+    if isinstance(value, str) and isinstance(unit, str):
+        return _date_trunc_text(unit, value)
     dt = _parse_iso_datetime(value)
     if dt is None:
         return None
-
-    unit = (unit or "").lower()
-    if unit == "second":
-        truncated = dt.replace(microsecond=0)
-    elif unit == "minute":
-        truncated = dt.replace(second=0, microsecond=0)
-    elif unit == "hour":
-        truncated = dt.replace(minute=0, second=0, microsecond=0)
-    elif unit == "day":
-        truncated = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif unit == "week":
-        monday = dt - timedelta(days=dt.weekday())
-        truncated = monday.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif unit == "month":
-        truncated = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    elif unit == "quarter":
-        quarter_start_month = ((dt.month - 1) // 3) * 3 + 1
-        truncated = dt.replace(month=quarter_start_month, day=1, hour=0, minute=0, second=0, microsecond=0)
-    elif unit == "year":
-        truncated = dt.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    else:
-        truncated = dt
-
-    return truncated.isoformat()
+    return _truncate_datetime((unit or "").lower(), dt).isoformat()
 
 
 def _sqlite_date_part(field: str, value: Any) -> float | None:
@@ -232,24 +314,35 @@ def _sqlite_date_part(field: str, value: Any) -> float | None:
     return None
 
 
+# Postgres to_char tokens and their strftime equivalents, substituted in this order.
+_TO_CHAR_TOKENS = (("YYYY", "%Y"), ("YY", "%y"), ("MM", "%m"), ("DD", "%d"), ("ID", "%u"), ("IW", "%V"))
+
+
+@lru_cache(maxsize=64)
+def _to_char_strftime(fmt: str) -> str | None:
+    """Translate a to_char pattern into a single strftime format, or ``None`` if it has no tokens."""
+    # Tokens are first swapped for private-use placeholders so the letters of one
+    # directive can never be read as part of the next token.
+    marked = fmt
+    for index, (token, _) in enumerate(_TO_CHAR_TOKENS):
+        marked = marked.replace(token, chr(0xE000 + index))
+    if marked == fmt:
+        return None
+    translated = marked.replace("%", "%%")
+    for index, (_, directive) in enumerate(_TO_CHAR_TOKENS):
+        translated = translated.replace(chr(0xE000 + index), directive)
+    return translated
+
+
 def _sqlite_to_char(value: Any, fmt: str) -> str | None:
     dt = _parse_iso_datetime(value)
     if dt is None:
         return None
 
-    replacements = {
-        "YYYY": dt.strftime("%Y"),
-        "YY": dt.strftime("%y"),
-        "MM": dt.strftime("%m"),
-        "DD": dt.strftime("%d"),
-        "ID": str(((dt.weekday() + 1) % 7) or 7),
-        "IW": dt.strftime("%V"),
-    }
-
-    result = fmt or ""
-    for token, value in replacements.items():
-        result = result.replace(token, value)
-    return result
+    pattern = _to_char_strftime(fmt or "")
+    if pattern is None:
+        return fmt or ""
+    return dt.strftime(pattern)
 
 
 def _register_sqlite_functions(conn: sqlite3.Connection) -> None:
@@ -259,10 +352,6 @@ def _register_sqlite_functions(conn: sqlite3.Connection) -> None:
     conn.create_function("to_char", 2, _sqlite_to_char)
 
 
-def _supports_responses_api(client: OpenAI) -> bool: # type: ignore
-    return hasattr(client, "responses")
-
-
 def _extract_response_text(completion: Any) -> str:
     if completion is None:
         return ""
@@ -296,13 +385,14 @@ def _create_chat_response(
     temperature: float,
     response_format: Dict[str, Any] | None = None,
 ) -> str:
-    if _supports_responses_api(client):
+    global _responses_accepts_format
+    if _openai_has_responses:
         kwargs: Dict[str, Any] = {
             "model": model,
             "temperature": temperature,
             "input": messages,
         }
-        if response_format is not None:
+        if response_format is not None and _responses_accepts_format:
             kwargs["response_format"] = response_format
         try:
             completion = client.responses.create(**kwargs)
@@ -310,8 +400,10 @@ def _create_chat_response(
             # Some OpenAI client versions do not support the response_format
             # argument on the responses API yet. Fallback to the same call
             # without that parameter and rely on the system prompt to
-            # encourage valid JSON output.
-            if "response_format" in str(exc) and response_format is not None:
+            # encourage valid JSON output; the answer is remembered so later
+            # calls skip the failing attempt.
+            if "response_format" in str(exc) and "response_format" in kwargs:
+                _responses_accepts_format = False
                 kwargs.pop("response_format", None)
                 completion = client.responses.create(**kwargs)
             else:
@@ -334,50 +426,186 @@ def _normalise_sql(sql: str) -> str:
     if not sql:
         raise ValueError("SQL is empty")
     lowered = sql.lower()
-    if not (lowered.startswith("select") or lowered.startswith("with")):
+    if not lowered.startswith(("select", "with")):
         raise ValueError("Only SELECT queries are allowed")
-    if FORBIDDEN_PATTERNS.search(sql):
+    if FORBIDDEN_PATTERNS.search(lowered):
         raise ValueError("Forbidden SQL pattern detected")
-    if not any(table in lowered for table in ALLOWED_TABLES):
+    if not _TABLE_RE.search(lowered):
         raise ValueError("Query must reference allowed tables")
     if "limit" not in lowered:
         sql = f"{sql} LIMIT {SQL_LIMIT}"
     return sql
 
 
+def _execute_sql_pg(sql: str, user_id: str) -> List[Dict[str, Any]] | None:
+    """Evaluate the query inside Postgres; ``None`` means the SQLite sandbox must be used.
+
+    Tenant scoping happens inside the function: it records ``user_id`` where only it can write
+    and runs the query as a role limited to views filtered on that value, so nothing in the
+    SQL can widen it.
+    """
+    global _pg_rpc_available
+    if not _pg_rpc_available:
+        return None
+    try:
+        response = get_supabase_client().rpc(PG_QUERY_RPC, {"query": sql, "user_id": user_id}).execute()
+    except APIError as exc:
+        if exc.code == "PGRST202":
+            # The function is not installed; stop asking for the rest of the process.
+            _pg_rpc_available = False
+        # Anything else is usually SQLite-only syntax, which the sandbox can still run.
+        return None
+    return response.data or []
+
+
 def _execute_sql(sql: str, user_id: str) -> List[Dict[str, Any]]:
-    tables_needed = {name for name in ALLOWED_TABLES if name in sql.lower()}
-    if not tables_needed:
-        tables_needed = ALLOWED_TABLES
+    signature = _cached_dataset_signature(user_id)
+    key = (user_id, sql, signature)
+    now = time.monotonic()
+    with _chat_cache_lock:
+        cached = _query_results.get(key)
+        if cached is not None and cached[0] > now:
+            _query_results.move_to_end(key)
+            return cached[1]
 
-    snapshots: Dict[str, List[Dict[str, Any]]] = {}
-    for table in tables_needed:
-        snapshots[table] = _fetch_table_snapshot(table, user_id)
+    lowered = sql.lower()
+    rows = _execute_sql_pg(sql, user_id)
+    if rows is None:
+        rows = _execute_sql_sqlite(sql, lowered, user_id, signature)
 
-    conn = sqlite3.connect(":memory:")
-    conn.row_factory = sqlite3.Row
-    _register_sqlite_functions(conn)
+    with _chat_cache_lock:
+        _query_results[key] = (now + RESULT_CACHE_TTL_SECONDS, rows)
+        _query_results.move_to_end(key)
+        while len(_query_results) > RESULT_CACHE_MAX_ENTRIES:
+            _query_results.popitem(last=False)
+    return rows
+
+
+def _rows_as_dicts(columns: List[str], rows: List[tuple[Any, ...]]) -> List[Dict[str, Any]]:
+    lowered = [name.lower() for name in columns]
+    if len(set(lowered)) == len(lowered):
+        return [dict(zip(columns, row)) for row in rows]
+    # Repeated names (case-insensitively) take the first column's value, as sqlite3.Row did.
+    positions = [lowered.index(name) for name in lowered]
+    return [dict(zip(columns, [row[index] for index in positions])) for row in rows]
+
+
+@dataclass
+class _SqliteSandbox:
+    conn: sqlite3.Connection
+    signature: str
+    loaded_at: float
+    tables: set[str] = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_sqlite_sandboxes: OrderedDict[str, _SqliteSandbox] = OrderedDict()
+_sqlite_sandboxes_lock = threading.Lock()
+_dataset_signatures: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_query_results: OrderedDict[tuple[str, str, str], tuple[float, List[Dict[str, Any]]]] = OrderedDict()
+_chat_cache_lock = threading.Lock()
+
+
+def _dataset_signature(user_id: str) -> str:
+    """Digest of the user's dataset ids and fingerprints; it changes on every upload or delete."""
+    client = get_supabase_client()
     try:
-        for table, rows in snapshots.items():
-            _load_sqlite_table(conn, table, rows)
-        cursor = conn.execute(sql)
-        results = cursor.fetchall()
-        return [dict(row) for row in results]
-    except Exception as exc:
-        raise SupabaseSQLExecutionError(f"Unable to evaluate the request: {exc}") from exc
-    finally:
-        conn.close()
+        response = client.table("energy_datasets").select("id, fingerprint").eq("user_id", user_id).execute()
+    except APIError as exc:
+        raise SupabaseSQLExecutionError(f"Unable to load data from energy_datasets: {exc.message}") from exc
+    except SupabaseStorageError as exc:
+        raise SupabaseSQLExecutionError(str(exc)) from exc
+    entries = sorted(f"{row.get('id')}:{row.get('fingerprint')}" for row in response.data or [])
+    return sha256("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def _cached_dataset_signature(user_id: str) -> str:
+    now = time.monotonic()
+    with _chat_cache_lock:
+        cached = _dataset_signatures.get(user_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    signature = _dataset_signature(user_id)
+    with _chat_cache_lock:
+        _dataset_signatures[user_id] = (now + DATASET_SIGNATURE_TTL_SECONDS, signature)
+        _dataset_signatures.move_to_end(user_id)
+        while len(_dataset_signatures) > DATASET_SIGNATURE_MAX_USERS:
+            _dataset_signatures.popitem(last=False)
+    return signature
+
+
+def forget_user_data(user_id: str) -> None:
+    """Drop cached chat state for a user whose datasets just changed."""
+    with _chat_cache_lock:
+        _dataset_signatures.pop(user_id, None)
+    with _sqlite_sandboxes_lock:
+        _sqlite_sandboxes.pop(user_id, None)
+
+
+def _new_sqlite_sandbox(signature: str) -> _SqliteSandbox:
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    # The database only ever holds a disposable snapshot, so journaling buys nothing.
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    _register_sqlite_functions(conn)
+    return _SqliteSandbox(conn=conn, signature=signature, loaded_at=time.monotonic())
+
+
+def _get_sqlite_sandbox(user_id: str, signature: str) -> _SqliteSandbox:
+    now = time.monotonic()
+    with _sqlite_sandboxes_lock:
+        sandbox = _sqlite_sandboxes.get(user_id)
+        if (
+            sandbox is not None
+            and sandbox.signature == signature
+            and now - sandbox.loaded_at < SETTINGS.chat_snapshot_ttl_seconds
+        ):
+            _sqlite_sandboxes.move_to_end(user_id)
+            return sandbox
+        # Replaced and evicted connections are closed once no running query holds them.
+        sandbox = _new_sqlite_sandbox(signature)
+        _sqlite_sandboxes[user_id] = sandbox
+        _sqlite_sandboxes.move_to_end(user_id)
+        while len(_sqlite_sandboxes) > SQLITE_SANDBOX_MAX_USERS:
+            _sqlite_sandboxes.popitem(last=False)
+        return sandbox
+
+
+def _execute_sql_sqlite(sql: str, lowered: str, user_id: str, signature: str) -> List[Dict[str, Any]]:
+    tables_needed = set(_TABLE_RE.findall(lowered))
+    if not tables_needed:
+        tables_needed = ALLOWED_TABLES
+
+    sandbox = _get_sqlite_sandbox(user_id, signature)
+    with sandbox.lock:
+        tables = [table for table in tables_needed if table not in sandbox.tables]
+        snapshots: Dict[str, List[tuple[Any, ...]]] = dict(
+            zip(tables, _snapshot_executor.map(lambda table: _fetch_table_snapshot(table, user_id), tables))
+        )
+        conn = sandbox.conn
+        try:
+            if snapshots:
+                conn.execute("PRAGMA query_only = OFF")
+                try:
+                    for table, rows in snapshots.items():
+                        # Start clean in case an earlier load of this table failed halfway.
+                        conn.execute(f"DROP TABLE IF EXISTS {table}")
+                        _load_sqlite_table(conn, table, rows)
+                    conn.commit()
+                finally:
+                    conn.execute("PRAGMA query_only = ON")
+                sandbox.tables.update(snapshots)
+            cursor = conn.execute(sql)
+            results = cursor.fetchall()
+            return _rows_as_dicts([column[0] for column in cursor.description], results)
+        except Exception as exc:
+            raise SupabaseSQLExecutionError(f"Unable to evaluate the request: {exc}") from exc
 
 
 def _normalise_chat_message(item: ChatHistoryMessage | Dict[str, str]) -> Dict[str, str]:
     if isinstance(item, dict):
-        role = item.get("role", "user") or "user"
-        content = item.get("content", "") or ""
-        return {"role": role, "content": content}
-
-    role = getattr(item, "role", "user") or "user"
-    content = getattr(item, "content", "") or ""
-    return {"role": role, "content": content}
+        return {"role": item.get("role") or "user", "content": item.get("content") or ""}
+    return {"role": getattr(item, "role", None) or "user", "content": getattr(item, "content", None) or ""}
 
 
 def _call_openai_for_sql(
@@ -386,10 +614,9 @@ def _call_openai_for_sql(
     client = _ensure_openai()
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": _sql_system_prompt()},
+        *map(_normalise_chat_message, history),
+        {"role": "user", "content": question},
     ]
-    for item in history:
-        messages.append(_normalise_chat_message(item))
-    messages.append({"role": "user", "content": question})
 
     content = _create_chat_response(
         client,
@@ -409,21 +636,19 @@ def _call_openai_for_sql(
 
 def _call_openai_for_answer(question: str, analysis: str, sql: str | None, rows: List[Dict[str, Any]]) -> str:
     client = _ensure_openai()
-    truncated_rows = rows[:SQL_LIMIT]
+    # The model only needs a representative sample to narrate; prompt tokens grow with every row.
+    sample_rows = rows[: SETTINGS.chat_answer_row_limit]
+    payload = {
+        "question": question,
+        "analysis": analysis,
+        "executed_sql": sql,
+        "result_rows": sample_rows,
+    }
+    if len(sample_rows) < len(rows):
+        payload["total_row_count"] = len(rows)
     messages = [
         {"role": "system", "content": _response_system_prompt()},
-        {
-            "role": "user",
-            "content": json.dumps(
-                {
-                    "question": question,
-                    "analysis": analysis,
-                    "executed_sql": sql,
-                    "result_rows": truncated_rows,
-                },
-                ensure_ascii=False,
-            ),
-        },
+        {"role": "user", "content": orjson.dumps(payload, default=str).decode("utf-8")},
     ]
     content = _create_chat_response(
         client,
@@ -446,7 +671,10 @@ def run_chat_agent(
     if not user_id:
         raise RuntimeError("User context is required for chat analysis.")
 
-    decision = _call_openai_for_sql(question, history)
+    if not history and SMALL_TALK_PATTERN.match(question):
+        decision = {"analysis": OFF_TOPIC_ANALYSIS, "sql": None}
+    else:
+        decision = _call_openai_for_sql(question, history)
     analysis = decision.get("analysis", "")
     sql = decision.get("sql")
 
@@ -1,18 +1,19 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import importlib.util
 import json
 import logging
 import os
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Sequence
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
 
-from pydantic import ValidationError
-
-try:
-    from openai import OpenAI
-except ImportError:  # pragma: no cover - optional dependency
-    OpenAI = None  # type: ignore[assignment]
+import orjson
+from pydantic import BaseModel, ValidationError
 
 from ..core.config import get_settings
 from ..schemas import (
@@ -23,11 +24,30 @@ from ..schemas import (
     RecommendationLocalizedText,
 )
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 logger = logging.getLogger("energy_insight.ai")
 SETTINGS = get_settings()
 
-_openai_client: object | None = None
+_openai_client: AsyncOpenAI | None = None
 _client_status_logged = False
+# Connection pool for the shared client; the httpx defaults queue concurrent uploads
+# behind a small pool and surface as PoolTimeout under load.
+OPENAI_MAX_CONNECTIONS = 100
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 50
+OPENAI_TIMEOUT_SECONDS = 60.0
+OPENAI_CONNECT_TIMEOUT_SECONDS = 5.0
+# The SDK retries 408/409/429/5xx, connection errors and timeouts with jittered exponential
+# backoff (0.5s doubling up to 8s, honouring Retry-After); four attempts before we fall back.
+OPENAI_MAX_RETRIES = 3
+# Re-uploading the same CSV (retries, duplicate uploads) produces the same prompt; reuse the answer.
+AI_CACHE_TTL_SECONDS = 3600.0
+AI_CACHE_MAX_ENTRIES = 512
+# Only touched from the event loop, so no lock is needed.
+_ai_cache: OrderedDict[str, tuple[float, List[Recommendation]]] = OrderedDict()
+# Identical prompts that arrive while a completion is already running wait for that one.
+_ai_inflight: Dict[str, asyncio.Task[List[Recommendation] | None]] = {}
 SYSTEM_PROMPT = """
 You are Energy Insight's virtual energy manager. Use the provided analytics summary and insights to craft actionable,
 data-backed recommendations. Always produce exactly three entries with the categories cost_saving, co2_reduction, and
@@ -39,7 +59,13 @@ simple identifier such as "per_month", "per_year", or "per_day". Each tips array
 items (<= 120 characters), specific to the supplied data, grounded in the supplied data, and free of Markdown or
 numbering. Do not add explanatory text outside the JSON. Every string value must fit on a single line without literal
 newline characters; escape any internal double quotes with \".
+Long usage series are trimmed to their earliest and latest points; "usage_points_omitted" counts the points left out.
+Base any trend on the stats and insights, and never invent values for omitted points.
 """.strip()
+# The model only needs the headline figures plus the edges of the usage series; the full
+# series and presentation-only fields cost input tokens without improving the advice.
+PROMPT_SUMMARY_FIELDS = {"stats", "insights"}
+PROMPT_USAGE_EDGE_POINTS = 14
 
 
 RECOMMENDATION_FUNCTION = {
@@ -179,13 +205,13 @@ def _build_recommendation(
     )
 
 
-def _fallback_cost_recommendation(summary: AnalyticsSummary) -> Recommendation:
+def _fallback_cost_recommendation(summary: AnalyticsSummary, stats: Dict[str, object]) -> Recommendation:
     insights = summary.insights
     top_day = insights.top_expensive_days[0] if insights and insights.top_expensive_days else None
     second_day = insights.top_expensive_days[1] if insights and len(insights.top_expensive_days) > 1 else None
     low_day = insights.top_expensive_days[-1] if insights and insights.top_expensive_days else None
-    high_cost = top_day.cost if top_day else _safe_float(_stat_value(summary, "total cost")) or 0.0
-    total_cost = _safe_float(_stat_value(summary, "total cost")) or high_cost
+    high_cost = top_day.cost if top_day else _safe_float(stats.get("total cost")) or 0.0
+    total_cost = _safe_float(stats.get("total cost")) or high_cost
     avg_daily_cost = (total_cost / insights.days_covered) if insights and insights.days_covered else total_cost
     delta_cost = max(high_cost - avg_daily_cost, 0.0)
     day_label = _iso_date_label(top_day.date if top_day else None)
@@ -217,9 +243,9 @@ def _fallback_cost_recommendation(summary: AnalyticsSummary) -> Recommendation:
     )
 
 
-def _fallback_co2_recommendation(summary: AnalyticsSummary) -> Recommendation:
+def _fallback_co2_recommendation(summary: AnalyticsSummary, stats: Dict[str, object]) -> Recommendation:
     insights = summary.insights
-    co2_total = _safe_float(_stat_value(summary, "co2 emission")) or 0.0
+    co2_total = _safe_float(stats.get("co2 emission")) or 0.0
     days = insights.days_covered if insights and insights.days_covered else 30
     daily_co2 = co2_total / days if days else co2_total
     weekend_vs_weekday = insights.weekend_vs_weekday if insights else None
@@ -252,7 +278,7 @@ def _fallback_co2_recommendation(summary: AnalyticsSummary) -> Recommendation:
     )
 
 
-def _fallback_efficiency_recommendation(summary: AnalyticsSummary) -> Recommendation:
+def _fallback_efficiency_recommendation(summary: AnalyticsSummary, stats: Dict[str, object]) -> Recommendation:
     insights = summary.insights
     if insights and insights.peak_window:
         window = insights.peak_window
@@ -261,7 +287,7 @@ def _fallback_efficiency_recommendation(summary: AnalyticsSummary) -> Recommenda
         avg_kwh = window.avg_kwh_per_day
         window_label = f"{start_hour:02d}:00-{end_hour:02d}:00"
     else:
-        avg_kwh = _safe_float(_stat_value(summary, "peak usage day")) or 0.0
+        avg_kwh = _safe_float(stats.get("peak usage day")) or 0.0
         window_label = "les heures de pointe"
     impact_value = f"{avg_kwh:.1f} kWh"
     usage_points = summary.usage[:3]
@@ -291,10 +317,11 @@ def _fallback_efficiency_recommendation(summary: AnalyticsSummary) -> Recommenda
 
 
 def _build_fallback_recommendations(summary: AnalyticsSummary) -> List[Recommendation]:
+    stats = _stats_index(summary)
     fallbacks = [
-        _fallback_cost_recommendation(summary),
-        _fallback_co2_recommendation(summary),
-        _fallback_efficiency_recommendation(summary),
+        _fallback_cost_recommendation(summary, stats),
+        _fallback_co2_recommendation(summary, stats),
+        _fallback_efficiency_recommendation(summary, stats),
     ]
     return fallbacks
 
@@ -303,11 +330,12 @@ def _ensure_required_recommendations(
     recommendations: List[Recommendation], summary: AnalyticsSummary
 ) -> List[Recommendation]:
     required = ("cost_saving", "co2_reduction", "efficiency")
+    stats = _stats_index(summary)
     result = list(recommendations)
     existing = {rec.category for rec in result}
     for category in required:
         if category not in existing:
-            fallback = _fallback_for_category(category, summary)
+            fallback = _fallback_for_category(category, summary, stats)
             if fallback:
                 result.append(fallback)
                 existing.add(category)
@@ -315,58 +343,45 @@ def _ensure_required_recommendations(
         if len(result) >= 3:
             break
         if category not in existing:
-            fallback = _fallback_for_category(category, summary)
+            fallback = _fallback_for_category(category, summary, stats)
             if fallback:
                 result.append(fallback)
                 existing.add(category)
     return result
 
 
-def _fallback_for_category(category: str, summary: AnalyticsSummary) -> Recommendation | None:
+def _fallback_for_category(
+    category: str, summary: AnalyticsSummary, stats: Dict[str, object]
+) -> Recommendation | None:
     if category == "cost_saving":
-        return _fallback_cost_recommendation(summary)
+        return _fallback_cost_recommendation(summary, stats)
     if category == "co2_reduction":
-        return _fallback_co2_recommendation(summary)
+        return _fallback_co2_recommendation(summary, stats)
     if category == "efficiency":
-        return _fallback_efficiency_recommendation(summary)
+        return _fallback_efficiency_recommendation(summary, stats)
     return None
 
 
-def _stat_value(summary: AnalyticsSummary, keyword: str) -> object | None:
-    keyword_lower = keyword.lower()
-    for stat in summary.stats:
-        if stat.title.lower() == keyword_lower:
-            return stat.value
-    return None
+def _stats_index(summary: AnalyticsSummary) -> Dict[str, object]:
+    """Map lower-cased stat titles to values; the first stat wins on duplicate titles."""
+    return {stat.title.lower(): stat.value for stat in reversed(summary.stats)}
+
+
+# A JSON string literal, possibly left unterminated at the end of the payload.
+_JSON_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*(?:"|\\?\Z)', re.DOTALL)
+# Escape pairs are kept verbatim; bare CR/LF characters inside a string become spaces.
+_STRING_LINE_BREAK_RE = re.compile(r"(\\.)|[\r\n]", re.DOTALL)
+
+
+def _flatten_string_literal(match: re.Match[str]) -> str:
+    literal = match.group(0)
+    if "\\\n" in literal or "\\\r" in literal:
+        return _STRING_LINE_BREAK_RE.sub(lambda part: part.group(1) or " ", literal)
+    return literal.replace("\n", " ").replace("\r", " ")
 
 
 def _sanitize_json_like(payload: str) -> str:
-    result: list[str] = []
-    in_string = False
-    escaped = False
-    for ch in payload:
-        if in_string:
-            if escaped:
-                result.append(ch)
-                escaped = False
-                continue
-            if ch == "\\":
-                result.append(ch)
-                escaped = True
-                continue
-            if ch == "\"":
-                in_string = False
-                result.append(ch)
-                continue
-            if ch in ("\n", "\r"):
-                result.append(" ")
-                continue
-            result.append(ch)
-        else:
-            if ch == "\"":
-                in_string = True
-            result.append(ch)
-    return "".join(result)
+    return _JSON_STRING_RE.sub(_flatten_string_literal, payload)
 
 
 async def apply_ai_recommendations(summary: AnalyticsSummary) -> AnalyticsSummary:
@@ -376,9 +391,15 @@ async def apply_ai_recommendations(summary: AnalyticsSummary) -> AnalyticsSummar
     return summary.model_copy(update={"recommendations": []})
 
 
-def _get_openai_client() -> object | None:
+def _get_openai_client() -> AsyncOpenAI | None:
     global _openai_client, _client_status_logged
-    if OpenAI is None:
+    if _openai_client is not None:
+        return _openai_client
+    try:
+        # Imported on first use so processes that never generate recommendations skip the SDK.
+        import httpx
+        from openai import AsyncOpenAI
+    except ImportError:  # pragma: no cover - optional dependency
         if not _client_status_logged:
             logger.warning("openai package is not installed; AI recommendations disabled.")
             _client_status_logged = True
@@ -388,17 +409,40 @@ def _get_openai_client() -> object | None:
             logger.info("OPENAI_API_KEY not set; returning empty recommendations.")
             _client_status_logged = True
         return None
-    if _openai_client is None:
-        _openai_client = OpenAI()
-        logger.info("OpenAI client initialized for model '%s'.", SETTINGS.openai_model)
+    # One async client per process so its HTTP connection pool is reused across uploads.
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+        http2=importlib.util.find_spec("h2") is not None,
+    )
+    _openai_client = AsyncOpenAI(http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+    logger.info("OpenAI client initialized for model '%s'.", SETTINGS.openai_model)
     return _openai_client
 
 
+async def close_openai_client() -> None:
+    """Close the shared OpenAI client and its connection pool."""
+    global _openai_client
+    client, _openai_client = _openai_client, None
+    if client is not None:
+        await client.close()
+
+
 def _build_recommendation_prompt(summary: AnalyticsSummary) -> str:
-    payload = summary.model_dump()
+    payload = summary.model_dump(mode="json", include=PROMPT_SUMMARY_FIELDS)
+    usage = summary.usage
+    omitted = len(usage) - 2 * PROMPT_USAGE_EDGE_POINTS
+    if omitted > 0:
+        usage = usage[:PROMPT_USAGE_EDGE_POINTS] + usage[-PROMPT_USAGE_EDGE_POINTS:]
+        payload["usage_points_omitted"] = omitted
+    payload["usage"] = [point.model_dump(mode="json") for point in usage]
+    payload = orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()
     return (
         "Analytics summary JSON (including insights):\n"
-        f"{json.dumps(payload, indent=2, ensure_ascii=False)}\n"
+        f"{payload}\n"
         "Use these metrics to tailor cost saving, CO₂ reduction, and efficiency advice in both English and French."
     )
 
@@ -409,7 +453,7 @@ def _normalize_recommendations(
     recommendations = data.get("recommendations")
     if not isinstance(recommendations, list):
         logger.warning("OpenAI JSON payload missing 'recommendations' array.")
-        return _build_fallback_recommendations(summary)
+        return None
 
     validated: List[Recommendation] = []
     for item in recommendations:
@@ -426,8 +470,15 @@ def _normalize_recommendations(
         except ValidationError as exc:
             logger.warning("Skipping invalid recommendation entry %s: %s", item, exc)
 
+    return _finalize_recommendations(validated, summary)
+
+
+def _finalize_recommendations(
+    validated: List[Recommendation], summary: AnalyticsSummary
+) -> List[Recommendation] | None:
+    """Pad and order parsed recommendations; None when the model produced none usable."""
     if not validated:
-        return _build_fallback_recommendations(summary)
+        return None
 
     normalized = _ensure_required_recommendations(validated, summary)
     order = {"cost_saving": 0, "co2_reduction": 1, "efficiency": 2}
@@ -435,12 +486,82 @@ def _normalize_recommendations(
     return normalized[:3]
 
 
+class _RecommendationEnvelope(BaseModel):
+    """Function-call arguments, decoded and validated in one pydantic-core pass."""
+
+    recommendations: List[Recommendation]
+
+
+def _validate_envelope(raw: str) -> List[Recommendation] | None:
+    """Well-formed payloads in one pass; None sends the caller down its lenient path."""
+    try:
+        envelope = _RecommendationEnvelope.model_validate_json(raw)
+    except ValidationError:
+        # Invalid JSON or a malformed entry: the lenient path skips bad items one by one.
+        return None
+    for recommendation in envelope.recommendations:
+        if "tips" not in recommendation.model_fields_set and recommendation.content is not None:
+            recommendation.tips = list(recommendation.content.en.tips)
+    return envelope.recommendations
+
+
+def _construct_recommendation(item: Dict[str, Any]) -> Recommendation:
+    en, fr = item["content"]["en"], item["content"]["fr"]
+    content = RecommendationContent.model_construct(
+        en=RecommendationLocalizedText.model_construct(title=en["title"], impact=en["impact"], tips=en["tips"]),
+        fr=RecommendationLocalizedText.model_construct(title=fr["title"], impact=fr["impact"], tips=fr["tips"]),
+    )
+    impact = item["impact"]
+    return Recommendation.model_construct(
+        category=item["category"],
+        impact=RecommendationImpact.model_construct(value=impact["value"], period=impact["period"]),
+        tips=item["tips"] if "tips" in item else list(en["tips"]),
+        content=content,
+    )
+
+
+def _construct_function_recommendations(arguments: str) -> List[Recommendation] | None:
+    """Trust schema-constrained function-call output; None if its shape is off."""
+    try:
+        return [_construct_recommendation(item) for item in orjson.loads(arguments)["recommendations"]]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _parse_function_arguments(arguments: str, summary: AnalyticsSummary) -> List[Recommendation] | None:
+    if not SETTINGS.openai_strict_recommendations:
+        constructed = _construct_function_recommendations(arguments)
+        if constructed is not None:
+            return _finalize_recommendations(constructed, summary)
+
+    validated = _validate_envelope(arguments)
+    if validated is not None:
+        return _finalize_recommendations(validated, summary)
+
+    try:
+        payload = orjson.loads(arguments)
+    except orjson.JSONDecodeError:
+        logger.warning("Failed to parse function call arguments for recommendations.")
+        return None
+
+    if not isinstance(payload, dict):
+        logger.warning("Function call arguments not a JSON object.")
+        return None
+
+    return _normalize_recommendations(payload, summary)
+
+
 def _parse_recommendation_payload(
     content: str, summary: AnalyticsSummary
 ) -> List[Recommendation] | None:
+    validated = _validate_envelope(content)
+    if validated is not None:
+        return _finalize_recommendations(validated, summary)
+
     try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        # orjson has no lenient mode; stdlib json tolerates raw control characters.
         try:
             data = json.loads(content, strict=False)
         except json.JSONDecodeError:
@@ -450,23 +571,92 @@ def _parse_recommendation_payload(
             except json.JSONDecodeError:
                 snippet = content[:500].replace("\n", "\\n")
                 logger.warning("Failed to decode OpenAI recommendation payload. Sample: %s", snippet)
-                return _build_fallback_recommendations(summary)
+                return None
     if not isinstance(data, dict):
         logger.warning("OpenAI payload is not a JSON object.")
-        return _build_fallback_recommendations(summary)
+        return None
 
     return _normalize_recommendations(data, summary)
 
 
+def ai_recommendations_cache_clear() -> None:
+    """Forget cached OpenAI recommendations, e.g. after changing the prompt or model."""
+    _ai_cache.clear()
+
+
+def _cached_recommendations(key: str) -> List[Recommendation] | None:
+    cached = _ai_cache.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        del _ai_cache[key]
+        return None
+    _ai_cache.move_to_end(key)
+    return list(cached[1])
+
+
+def _store_recommendations(key: str, recommendations: List[Recommendation]) -> None:
+    _ai_cache[key] = (time.monotonic() + AI_CACHE_TTL_SECONDS, list(recommendations))
+    _ai_cache.move_to_end(key)
+    while len(_ai_cache) > AI_CACHE_MAX_ENTRIES:
+        _ai_cache.popitem(last=False)
+
+
 async def _request_ai_recommendations(summary: AnalyticsSummary) -> List[Recommendation] | None:
     client = _get_openai_client()
     if client is None:
         return None
 
     user_prompt = _build_recommendation_prompt(summary)
-
-    def _invoke():
-        return client.chat.completions.create(
+    cache_key = hashlib.sha256(f"{SETTINGS.openai_model}\n{user_prompt}".encode()).hexdigest()
+    recommendations = _cached_recommendations(cache_key)
+    if recommendations is not None:
+        return recommendations
+
+    task = _ai_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_complete_recommendations(client, summary, user_prompt))
+        _ai_inflight[cache_key] = task
+        task.add_done_callback(lambda _: _ai_inflight.pop(cache_key, None))
+    # Shielded so one caller disconnecting does not cancel the request for the others.
+    result = await asyncio.shield(task)
+    if result is None:
+        return None
+    recommendations, from_model = result
+    if from_model:
+        # Built-in fallback advice is never cached, so one malformed response is not pinned for the TTL.
+        _store_recommendations(cache_key, recommendations)
+    return list(recommendations)
+
+
+async def _read_completion_stream(stream: Any) -> tuple[bool, str, str]:
+    """Accumulate function-call argument and content deltas from a streamed completion."""
+    has_choices = False
+    arguments: List[str] = []
+    content: List[str] = []
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            has_choices = True
+            delta = chunk.choices[0].delta
+            func_call = getattr(delta, "function_call", None)
+            if func_call is not None and func_call.arguments:
+                arguments.append(func_call.arguments)
+            if delta.content:
+                content.append(delta.content)
+    finally:
+        # On cancellation or a dropped stream, hand the connection back to the pool right away.
+        await stream.response.aclose()
+    return has_choices, "".join(arguments), "".join(content)
+
+
+async def _complete_recommendations(
+    client: AsyncOpenAI, summary: AnalyticsSummary, user_prompt: str
+) -> tuple[List[Recommendation], bool] | None:
+    """Recommendations plus whether they came from the model; None if the request failed."""
+    try:
+        stream = await client.chat.completions.create(
             model=SETTINGS.openai_model,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
@@ -476,35 +666,23 @@ async def _request_ai_recommendations(summary: AnalyticsSummary) -> List[Recomme
             function_call={"name": "provide_recommendations"},
             temperature=0.2,
             max_tokens=700,
+            stream=True,
         )
-
-    try:
-        completion = await asyncio.to_thread(_invoke)
+        has_choices, arguments, content = await _read_completion_stream(stream)
     except Exception:
         logger.exception("OpenAI recommendation request failed.")
         return None
 
-    if not completion.choices:
+    recommendations: List[Recommendation] | None = None
+    if not has_choices:
         logger.warning("OpenAI recommendation response contained no choices.")
-        return _build_fallback_recommendations(summary)
-
-    message = completion.choices[0].message
-    func_call = getattr(message, "function_call", None)
-    if not func_call or not getattr(func_call, "arguments", None):
-        content = getattr(message, "content", None)
-        if not content:
-            logger.warning("OpenAI recommendation response missing function call arguments and content.")
-            return _build_fallback_recommendations(summary)
-        return _parse_recommendation_payload(content, summary)
-
-    try:
-        payload = json.loads(func_call.arguments)
-    except json.JSONDecodeError:
-        logger.warning("Failed to parse function call arguments for recommendations.")
-        return _build_fallback_recommendations(summary)
-
-    if not isinstance(payload, dict):
-        logger.warning("Function call arguments not a JSON object.")
-        return _build_fallback_recommendations(summary)
+    elif arguments:
+        recommendations = _parse_function_arguments(arguments, summary)
+    elif content:
+        recommendations = _parse_recommendation_payload(content, summary)
+    else:
+        logger.warning("OpenAI recommendation response missing function call arguments and content.")
 
-    return _normalize_recommendations(payload, summary)
+    if recommendations is None:
+        return _build_fallback_recommendations(summary), False
+    return recommendations, True
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import importlib.util
 import json
+import logging
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from hashlib import sha256
-from typing import Iterable, List
+from typing import List
 
+import httpx
+import numpy as np
 from postgrest import APIError
-from supabase import Client, create_client
+from postgrest.types import ReturnMethod
+from supabase import Client, ClientOptions, create_client
 
 from ..core.config import get_settings
 from ..schemas import (
@@ -15,10 +22,25 @@ from ..schemas import (
     DatasetRecord,
     ReadingRecord,
 )
-from .analytics import EnergyReading
+from .analytics import EnergyReadings
 
 SETTINGS = get_settings()
+logger = logging.getLogger("energy_insight.storage")
 _client: Client | None = None
+_client_lock = threading.Lock()
+# One pooled HTTP client shared by the PostgREST, auth and storage sub-clients. Request threads,
+# readings-insert workers and chat snapshot workers all draw from it.
+SUPABASE_MAX_CONNECTIONS = 64
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = 32
+SUPABASE_TIMEOUT_SECONDS = 120.0
+SUPABASE_CONNECT_TIMEOUT_SECONDS = 10.0
+_http_client: httpx.Client | None = None
+# Readings are inserted in slices side by side; one request per upload hits PostgREST body
+# limits and timeouts on large CSVs. ENERGY_INSIGHT_READINGS_CHUNK_ROWS=0 sends a single request.
+_insert_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="readings-insert")
+# Optional SQL function that inserts a dataset unless its fingerprint exists, in one round trip.
+DATASET_INSERT_RPC = "insert_dataset_if_new"
+_dataset_rpc_available = True
 
 
 class SupabaseConfigurationError(RuntimeError):
@@ -40,26 +62,75 @@ def _require_credentials() -> tuple[str, str]:
 
 
 def _get_client() -> Client:
-    global _client
+    global _client, _http_client
     if _client is None:
-        url, key = _require_credentials()
-        _client = create_client(url, key)
+        with _client_lock:
+            if _client is None:
+                url, key = _require_credentials()
+                # supabase-py only accepts a caller-owned httpx client from 2.16 on.
+                if "httpx_client" in getattr(ClientOptions, "__dataclass_fields__", ()):
+                    _http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=SUPABASE_MAX_CONNECTIONS,
+                            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                        ),
+                        timeout=httpx.Timeout(SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS),
+                        follow_redirects=True,
+                        http2=importlib.util.find_spec("h2") is not None,
+                    )
+                    _client = create_client(url, key, options=ClientOptions(httpx_client=_http_client))
+                else:
+                    _client = create_client(url, key)
     return _client
 
 
+def close_supabase() -> None:
+    """Close the shared Supabase client's HTTP pool."""
+    global _client, _http_client
+    with _client_lock:
+        http_client, _http_client, _client = _http_client, None, None
+    if http_client is not None:
+        http_client.close()
+
+
 def get_supabase_client() -> Client:
     """Return a cached Supabase client instance for reuse across services."""
     return _get_client()
 
 
-def _compute_fingerprint(readings: List[EnergyReading]) -> str:
+# Hashed ahead of the arrays so the byte layout can change without colliding with older digests.
+FINGERPRINT_VERSION = b"energy-readings/v2"
+FINGERPRINT_CHUNK_ROWS = 65536
+
+
+def _compute_fingerprint(readings: EnergyReadings) -> str:
+    # Three equal-length little-endian arrays: UTC epoch microseconds, kWh and cost (NaN as 0).
+    # Duplicate detection, not a security boundary; this also keeps FIPS-mode OpenSSL happy.
+    digest = sha256(FINGERPRINT_VERSION, usedforsecurity=False)
+    digest.update(np.ascontiguousarray(readings.instants.view(np.int64), dtype="<i8"))
+    buffer = np.empty(min(len(readings), FINGERPRINT_CHUNK_ROWS), dtype="<f8")
+    for column in (readings.kwh, readings.cost):
+        for start in range(0, len(column), FINGERPRINT_CHUNK_ROWS):
+            chunk = buffer[: min(FINGERPRINT_CHUNK_ROWS, len(column) - start)]
+            np.round(column[start : start + len(chunk)], 6, out=chunk)
+            np.nan_to_num(chunk, copy=False)
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compute_legacy_fingerprint(readings: EnergyReadings) -> str:
+    """JSON-based fingerprint used before FINGERPRINT_VERSION; kept for matching older datasets."""
     payload = [
         (
-            reading.reading_at.isoformat(),
-            round(reading.kwh, 6),
-            round(float(reading.cost or 0.0), 6),
+            timestamp,
+            round(kwh, 6),
+            round(cost, 6),
+        )
+        for timestamp, kwh, cost in zip(
+            readings.iso_instants,
+            readings.kwh.tolist(),
+            np.nan_to_num(readings.cost).tolist(),
         )
-        for reading in readings
     ]
     serialized = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
     return sha256(serialized.encode("utf-8")).hexdigest()
@@ -67,27 +138,73 @@ def _compute_fingerprint(readings: List[EnergyReading]) -> str:
 
 def store_dataset(
     original_filename: str,
-    readings: Iterable[EnergyReading],
+    readings: EnergyReadings,
     summary: AnalyticsSummary,
     user_id: str,
 ) -> None:
     client = _get_client()
-    readings_list = list(readings)
     uploaded_at = datetime.now(timezone.utc).isoformat()
 
-    total_kwh = sum(r.kwh for r in readings_list)
-    total_cost = sum((r.cost or 0.0) for r in readings_list)
+    # NaN-free costs are shared by the total and the readings payload below.
+    costs = np.nan_to_num(readings.cost)
+    total_kwh = float(readings.kwh.sum())
+    total_cost = float(costs.sum())
     total_co2 = total_kwh * SETTINGS.co2_factor
 
-    fingerprint = _compute_fingerprint(readings_list)
+    fingerprint = _compute_fingerprint(readings)
+    # Datasets stored before FINGERPRINT_VERSION carry the JSON digest; a match on either is a duplicate.
+    legacy_fingerprint = _compute_legacy_fingerprint(readings)
     summary_payload = summary.model_dump(mode="json")
 
+    dataset_payload = {
+        "original_filename": original_filename,
+        "uploaded_at": uploaded_at,
+        "total_kwh": total_kwh,
+        "total_cost": total_cost,
+        "total_co2": total_co2,
+        "row_count": len(readings),
+        "summary_json": summary_payload,
+        "fingerprint": fingerprint,
+        "user_id": user_id,
+    }
+    dataset_id = _insert_dataset_row(client, dataset_payload, legacy_fingerprint)
+
+    if len(readings):
+        try:
+            copied = bool(SETTINGS.supabase_db_url) and _copy_readings(dataset_id, user_id, readings, costs)
+            if not copied:
+                _insert_readings(client, dataset_id, user_id, readings, costs)
+        except Exception:
+            # Never leave a dataset row with partial readings; it would block the retry as a duplicate.
+            _discard_dataset(client, dataset_id, user_id)
+            raise
+
+
+def _insert_dataset_row(client: Client, dataset_payload: dict, legacy_fingerprint: str) -> int:
+    """Insert the dataset row and return its id; raises ``duplicate-dataset`` for a known fingerprint."""
+    global _dataset_rpc_available
+    if _dataset_rpc_available:
+        try:
+            response = client.rpc(
+                DATASET_INSERT_RPC, {"dataset": dataset_payload, "legacy_fingerprint": legacy_fingerprint}
+            ).execute()
+        except APIError as exc:
+            if exc.code != "PGRST202":
+                raise SupabaseStorageError(f"Failed to store dataset metadata: {exc.message}") from exc
+            # The function is not installed; use the check-then-insert path for the rest of the process.
+            _dataset_rpc_available = False
+        else:
+            rows: List[dict] = response.data or []
+            if not rows:
+                raise SupabaseStorageError("duplicate-dataset")
+            return rows[0]["dataset_id"]
+
     try:
         duplicate_check = (
             client.table(SETTINGS.supabase_dataset_table)
             .select("id")
-            .eq("fingerprint", fingerprint)
-            .eq("user_id", user_id)
+            .in_("fingerprint", [dataset_payload["fingerprint"], legacy_fingerprint])
+            .eq("user_id", dataset_payload["user_id"])
             .limit(1)
             .execute()
         )
@@ -100,45 +217,140 @@ def store_dataset(
     if duplicate_check.data:
         raise SupabaseStorageError("duplicate-dataset")
 
-    dataset_payload = {
-        "original_filename": original_filename,
-        "uploaded_at": uploaded_at,
-        "total_kwh": total_kwh,
-        "total_cost": total_cost,
-        "total_co2": total_co2,
-        "row_count": len(readings_list),
-        "summary_json": summary_payload,
-        "fingerprint": fingerprint,
-        "user_id": user_id,
-    }
-
+    insert_query = client.table(SETTINGS.supabase_dataset_table).insert(dataset_payload)
+    if hasattr(insert_query, "select"):
+        # Only the new id is needed; without this PostgREST echoes the whole row, summary_json included.
+        # Older postgrest-py releases cannot project an insert and fall back to the full row.
+        insert_query = insert_query.select("id")
     try:
-        insert_response = client.table(SETTINGS.supabase_dataset_table).insert(dataset_payload).execute()
+        insert_response = insert_query.execute()
     except APIError as exc:
+        if exc.code == "23505":
+            # Lost a race with a concurrent upload of the same file.
+            raise SupabaseStorageError("duplicate-dataset") from exc
         raise SupabaseStorageError(f"Failed to store dataset metadata: {exc.message}") from exc
 
     inserted_rows: List[dict] = insert_response.data or []
     dataset_id = inserted_rows[0].get("id") if inserted_rows else None
     if dataset_id is None:
         raise SupabaseStorageError("Supabase did not return an inserted dataset id.")
+    return dataset_id
+
 
-    if readings_list:
-        readings_payload = [
+READINGS_COPY_COLUMNS = ("dataset_id", "user_id", "reading_date", "reading_at", "reading_time", "kwh", "cost")
+READINGS_COPY_BATCH_ROWS = 8192
+
+
+def _copy_text_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_readings(dataset_id: int, user_id: str, readings: EnergyReadings, costs: np.ndarray) -> bool:
+    """Stream readings into Postgres with COPY over SUPABASE_DB_URL; rows are never collected.
+
+    Returns ``False`` without writing anything when the direct connection cannot be opened
+    (pooler-only or IPv6-only hosts, bad credentials, timeouts), so the caller can fall back
+    to the REST insert.
+    """
+    import psycopg
+    from psycopg import sql
+
+    statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(SETTINGS.supabase_readings_table),
+        sql.SQL(", ").join(map(sql.Identifier, READINGS_COPY_COLUMNS)),
+    )
+    # Rows are written as pre-formatted COPY text: the shared columns are escaped once and each
+    # reading reuses its wall-clock ISO timestamp for the date and time fields, instead of
+    # adapting every value through write_row. reading_at keeps the file's offset, if any.
+    prefix = f"{dataset_id}\t{_copy_text_escape(user_id)}\t"
+    timestamps = readings.iso_timestamps
+    instants = readings.iso_instants
+    kwh_values = readings.kwh.tolist()
+    cost_values = costs.tolist()
+    try:
+        conn = psycopg.connect(SETTINGS.supabase_db_url, connect_timeout=10)
+    except psycopg.Error as exc:
+        logger.warning("Direct database connection failed; inserting readings through the REST API: %s", exc)
+        return False
+    try:
+        with conn, conn.cursor() as cursor:
+            with cursor.copy(statement) as copy:
+                for start in range(0, len(timestamps), READINGS_COPY_BATCH_ROWS):
+                    stop = start + READINGS_COPY_BATCH_ROWS
+                    copy.write(
+                        "".join(
+                            f"{prefix}{timestamp[:10]}\t{instant}\t{timestamp[11:]}\t{kwh!r}\t{cost!r}\n"
+                            for timestamp, instant, kwh, cost in zip(
+                                timestamps[start:stop],
+                                instants[start:stop],
+                                kwh_values[start:stop],
+                                cost_values[start:stop],
+                            )
+                        )
+                    )
+    except psycopg.Error as exc:
+        raise SupabaseStorageError(f"Failed to store dataset readings: {exc}") from exc
+    return True
+
+
+def _insert_readings(
+    client: Client, dataset_id: int, user_id: str, readings: EnergyReadings, costs: np.ndarray
+) -> None:
+    timestamps = readings.iso_timestamps
+    instants = readings.iso_instants
+    kwh_values = readings.kwh.tolist()
+    cost_values = costs.tolist()
+    chunk_rows = SETTINGS.readings_insert_chunk_rows
+    if chunk_rows <= 0:
+        chunk_rows = len(timestamps)
+
+    def insert_chunk(start: int) -> None:
+        # Each worker builds only its own slice of row dicts.
+        rows = [
             {
                 "dataset_id": dataset_id,
-                "reading_date": reading.reading_date.isoformat(),
-                "reading_at": reading.reading_at.isoformat(),
-                "reading_time": reading.reading_time.isoformat(timespec="seconds"),
-                "kwh": reading.kwh,
-                "cost": float(reading.cost or 0.0),
+                "reading_date": timestamp[:10],
+                "reading_at": instant,
+                "reading_time": timestamp[11:],
+                "kwh": kwh,
+                "cost": cost,
                 "user_id": user_id,
             }
-            for reading in readings_list
+            for timestamp, instant, kwh, cost in zip(
+                timestamps[start : start + chunk_rows],
+                instants[start : start + chunk_rows],
+                kwh_values[start : start + chunk_rows],
+                cost_values[start : start + chunk_rows],
+            )
         ]
-        try:
-            client.table(SETTINGS.supabase_readings_table).insert(readings_payload).execute()
-        except APIError as exc:
+        client.table(SETTINGS.supabase_readings_table).insert(rows, returning=ReturnMethod.minimal).execute()
+
+    futures = [_insert_executor.submit(insert_chunk, start) for start in range(0, len(timestamps), chunk_rows)]
+    # On the first failure, drop chunks that have not started and let running ones settle, so the
+    # caller's cleanup cannot race a late insert.
+    _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+    if pending:
+        for future in pending:
+            future.cancel()
+        wait(pending)
+    for future in futures:
+        if future.cancelled():
+            continue
+        exc = future.exception()
+        if isinstance(exc, APIError):
             raise SupabaseStorageError(f"Failed to store dataset readings: {exc.message}") from exc
+        if isinstance(exc, httpx.HTTPError):
+            raise SupabaseStorageError(f"Failed to store dataset readings: {exc}") from exc
+        if exc is not None:
+            raise exc
+
+
+def _discard_dataset(client: Client, dataset_id: int, user_id: str) -> None:
+    """Best-effort removal of a dataset whose readings were only partly stored (readings cascade)."""
+    try:
+        client.table(SETTINGS.supabase_dataset_table).delete().eq("id", dataset_id).eq("user_id", user_id).execute()
+    except (APIError, httpx.HTTPError) as exc:
+        logger.warning("Could not discard partially stored dataset %s: %s", dataset_id, exc)
 
 
 def fetch_latest_summary(user_id: str) -> AnalyticsSummary | None:
@@ -186,7 +398,14 @@ def fetch_dataset_history(limit: int, user_id: str) -> List[DatasetRecord]:
     return [DatasetRecord.model_validate(row) for row in rows]
 
 
-def fetch_dataset_detail(dataset_id: int, user_id: str) -> DatasetDetail:
+def fetch_dataset_detail(
+    dataset_id: int, user_id: str, limit: int | None = None, offset: int = 0
+) -> DatasetDetail:
+    """Load a dataset with one page of its readings.
+
+    ``limit=None`` returns every reading from ``offset`` on; ``limit=0`` skips the readings
+    query entirely for callers that only chart the stored summary.
+    """
     client = _get_client()
 
     try:
@@ -221,19 +440,29 @@ def fetch_dataset_detail(dataset_id: int, user_id: str) -> DatasetDetail:
     summary_payload = dataset_row.get("summary_json") or {}
     summary = AnalyticsSummary.model_validate(summary_payload)
 
+    if limit == 0:
+        return DatasetDetail(dataset=dataset, summary=summary, readings=[])
+
+    # Chunked inserts do not allocate ids in time order, so id only breaks ties between pages.
+    readings_query = (
+        client.table(SETTINGS.supabase_readings_table)
+        .select("reading_date, reading_time, reading_at, kwh, cost")
+        .eq("dataset_id", dataset_id)
+        .eq("user_id", user_id)
+        .order("reading_at")
+        .order("id")
+    )
+    if limit is not None:
+        readings_query = readings_query.range(offset, offset + limit - 1)
+    elif offset:
+        readings_query = readings_query.offset(offset)
     try:
-        readings_response = (
-            client.table(SETTINGS.supabase_readings_table)
-            .select("reading_date, reading_time, reading_at, kwh, cost")
-            .eq("dataset_id", dataset_id)
-            .eq("user_id", user_id)
-            .order("reading_date")
-            .execute()
-        )
+        readings_response = readings_query.execute()
     except APIError as exc:
         raise SupabaseStorageError(f"Failed to load dataset readings: {exc.message}") from exc
 
-    readings = [ReadingRecord.model_validate(row) for row in (readings_response.data or [])]
+    # Rows come straight from our own readings table with exactly these columns; skip re-validation.
+    readings = [ReadingRecord.model_construct(**row) for row in (readings_response.data or [])]
 
     return DatasetDetail(dataset=dataset, summary=summary, readings=readings)
 